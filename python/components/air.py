@@ -9,7 +9,6 @@ import subprocess
 import os
 
 # Rhino and Grasshopper imports
-import rhinoscriptsyntax as rs
 
 # Livestock imports
 from livestock.components.component import GHComponent
@@ -178,10 +177,7 @@ class NewAirConditions(GHComponent):
     def get_mesh_data(self):
         """Extracts the data needed from the mesh."""
 
-        mesh_faces = gh_geo.get_mesh_faces(self.mesh)
-
-        self.area = [rs.MeshArea(face)[1]
-                     for face in mesh_faces]
+        self.area = gh_geo.mesh_face_metrics(self.mesh)['area']
 
     def write_files(self):
         """Write the files."""
@@ -5,6 +5,7 @@ __license__ = "GNU GPLv3"
 # Imports
 
 # Module imports
+from array import array
 import os
 import xml.etree.ElementTree as ET
 import collections
@@ -15,16 +16,22 @@ import json
 import datetime
 from System.Diagnostics import Process
 import shutil
-import tempfile
 
 # Livestock imports
 import livestock.lib.ssh as ssh
 import livestock.lib.cmf_lib as cmf_lib
+import livestock.lib.epw as epw
 import livestock.lib.geometry as gh_geo
+import livestock.lib.mesh_store as mesh_store
+import livestock.lib.result_store as result_store
+import livestock.lib.weather_field as weather_field
+import livestock.lib.weather_store as weather_store
+from livestock.lib.case_writer import CaseWriter
 import livestock.lib.livestock_csv as csv
 from livestock.components.component import GHComponent
 from livestock.components import component
 import livestock.lib.misc as gh_misc
+import livestock.lib.templates as templates
 from livestock.lib.templates import pick_template
 
 # Grasshopper imports
@@ -267,15 +274,27 @@ class CMFGround(GHComponent):
             raise ValueError(w)
 
     def write_mesh(self, doc):
-        tmp_folder = os.path.join(tempfile.gettempdir(), 'livestock')
-        if not os.path.exists(tmp_folder):
-            os.mkdir(tmp_folder)
+        """
+        Adds the mesh to the Livestock mesh store.
+        Unchanged meshes are already in the store and are therefore not written again.
+
+        :param doc: Grasshopper document.
+        :return: Mesh name.
+        """
 
-        mesh_name = 'mesh_' + str(self.mesh_faces)
-        gh_geo.bake_export_delete(self.mesh_faces, tmp_folder,
-                                  mesh_name, '.obj', doc)
+        mesh = rs.coercemesh(self.mesh_faces)
 
-        return mesh_name
+        if mesh:
+            vertices, faces = gh_geo.mesh_to_arrays(mesh)
+            return mesh_store.store_mesh(vertices, faces)
+
+        else:
+            if not os.path.exists(mesh_store.store_path):
+                os.makedirs(mesh_store.store_path)
+
+            mesh_name = 'mesh_' + str(self.mesh_faces)
+            gh_geo.export_mesh(self.mesh_faces, mesh_store.store_path, mesh_name, doc)
+            return mesh_name
 
     def run(self, doc):
         """
@@ -508,6 +527,49 @@ class CMFWeather(GHComponent):
                                         ' is equal to the number of mesh faces.',
                          'access': 'tree',
                          'default_value': None},
+
+                    11: {'name': 'EPWFile',
+                         'description': 'Path to an EPW weather file. Weather parameters, which are not given as'
+                                        ' inputs, are read from the file. If no Location is given, the location of the'
+                                        ' file is used.',
+                         'access': 'item',
+                         'default_value': None},
+
+                    12: {'name': 'StartTime',
+                         'description': 'First hour to read from the EPW file. Either an hour of the year or a date'
+                                        ' and time.\nDefault is the first hour of the file',
+                         'access': 'item',
+                         'default_value': None},
+
+                    13: {'name': 'EndTime',
+                         'description': 'Last hour to read from the EPW file. Either an hour of the year or a date'
+                                        ' and time.\nDefault is the last hour of the file',
+                         'access': 'item',
+                         'default_value': None},
+
+                    14: {'name': 'Stations',
+                         'description': 'Locations of weather stations. Weather parameters given as a tree with a'
+                                        ' branch per station are interpolated from the stations to the cells.',
+                         'access': 'list',
+                         'default_value': None},
+
+                    15: {'name': 'Meshes',
+                         'description': 'Ground meshes in the same order as the grounds of the case. The face'
+                                        ' centroids are used to interpolate the station weather.',
+                         'access': 'list',
+                         'default_value': None},
+
+                    16: {'name': 'Neighbours',
+                         'description': 'Number of nearest stations to interpolate each cell from.'
+                                        '\nDefault is all stations',
+                         'access': 'item',
+                         'default_value': None},
+
+                    17: {'name': 'Power',
+                         'description': 'Power of the inverse distance weighting. 0 gives the mean of the'
+                                        ' stations.\nDefault is 2',
+                         'access': 'item',
+                         'default_value': 2},
                     }
 
         def outputs():
@@ -535,6 +597,9 @@ class CMFWeather(GHComponent):
         self.ground_temp = None
         self.location = None
         self.face_count = None
+        self.epw_weather = None
+        self.station_count = None
+        self.station_weights = None
 
     def check_inputs(self):
         """Checks inputs and raises a warning if an input is not the correct type."""
@@ -548,7 +613,8 @@ class CMFWeather(GHComponent):
         self.config_component(self.component_number)
 
     def run_checks(self, location, face_count, temp, wind, rel_hum, cloud_cover, global_radiation,
-                   rain, ground_temp):
+                   rain, ground_temp, epw_file=None, start_time=None, end_time=None, stations=None, meshes=None,
+                   neighbours=None, power=None):
         """
         Gathers the inputs and checks them.
 
@@ -561,6 +627,13 @@ class CMFWeather(GHComponent):
         :param ground_temp: Ground temperature.
         :param location: Ladybug Tool location
         :param face_count: Number of mesh faces in project
+        :param epw_file: Path to an EPW file
+        :param start_time: First hour to read from the EPW file
+        :param end_time: Last hour to read from the EPW file
+        :param stations: Weather station locations
+        :param meshes: Ground meshes
+        :param neighbours: Number of nearest stations to interpolate from
+        :param power: Power of the inverse distance weighting
         """
 
         # Gather data
@@ -568,6 +641,16 @@ class CMFWeather(GHComponent):
             self.face_count = int(face_count)
         self.location = location
 
+        self.station_count = None
+        self.station_weights = None
+        if stations and meshes:
+            if neighbours is None or neighbours == '':
+                neighbours = self.inputs[16]['default_value']
+            if power is None or power == '':
+                power = self.inputs[17]['default_value']
+
+            self.compute_station_weights(stations, meshes, neighbours, power)
+
         self.temp = self.match_cell_count(temp)
         self.wind = self.match_cell_count(wind)
         self.rel_hum = self.match_cell_count(rel_hum)
@@ -576,26 +659,124 @@ class CMFWeather(GHComponent):
         self.rain = self.match_cell_count(rain)
         self.ground_temp = self.match_cell_count(ground_temp)
 
+        self.epw_weather = None
+        if epw_file:
+            self.read_epw(str(epw_file), self.convert_time(start_time), self.convert_time(end_time))
+
         # Run checks
         self.check_inputs()
 
+    def compute_station_weights(self, stations, meshes, neighbours, power):
+        """
+        Computes the inverse distance weights of the weather stations for each cell.
+        See livestock.lib.weather_field.station_weights().
+
+        :param stations: Weather station locations.
+        :param meshes: Ground meshes.
+        :param neighbours: Number of nearest stations to interpolate from.
+        :param power: Power of the inverse distance weighting.
+        """
+
+        station_coordinates = []
+        for station in stations:
+            station_coordinates.extend(gh_geo.location_to_coordinates(station))
+
+        centroids = array('d')
+        for mesh in meshes:
+            centroids.extend(gh_geo.mesh_face_metrics(mesh)['centroid'])
+
+        if neighbours is not None:
+            neighbours = int(neighbours)
+            if neighbours < 1:
+                self.add_warning('Neighbours has to be at least 1. Got: ' + str(neighbours) +
+                                 '. All stations are used.')
+                neighbours = None
+
+        self.station_count = len(stations)
+        self.station_weights = weather_field.station_weights(centroids, station_coordinates, neighbours,
+                                                             float(power))
+
+        cell_count = len(self.station_weights[0]) - 1
+        if self.face_count and cell_count != self.face_count:
+            self.add_warning('The meshes have ' + str(cell_count) + ' faces, but MeshFaceCount is ' +
+                             str(self.face_count) + '. Check that all ground meshes are given in the order of the'
+                             ' grounds.')
+
+        if self.station_count == self.face_count:
+            self.add_warning('The number of stations equals the number of mesh faces. Weather with a list per'
+                             ' branch is used as weather per cell and not interpolated from the stations.')
+
+    @staticmethod
+    def convert_time(time):
+        """Converts a time input to an hour of the year, if it is a number. Dates and times are passed on as they are."""
+
+        if time is None or time == '':
+            return None
+
+        try:
+            return int(time)
+        except (TypeError, ValueError):
+            return time
+
+    def read_epw(self, epw_file, start_time, end_time):
+        """
+        Reads the weather parameters, which are not given as inputs, from an EPW file.
+        The series are used for all cells.
+
+        :param epw_file: Path to the EPW file.
+        :param start_time: First hour to read.
+        :param end_time: Last hour to read.
+        """
+
+        parameters = collections.OrderedDict([('temp', self.temp),
+                                              ('wind', self.wind),
+                                              ('rel_hum', self.rel_hum),
+                                              ('cloud_cover', self.cloud_cover),
+                                              ('global_radiation', self.global_radiation),
+                                              ('rain', self.rain),
+                                              ('ground_temp', self.ground_temp)])
+        missing = [name
+                   for name, value in parameters.items()
+                   if not value]
+
+        try:
+            self.epw_weather = epw.load_epw(epw_file, missing, start_time, end_time)
+        except (KeyError, ValueError) as error:
+            self.add_warning('Could not read the EPW file: ' + str(error))
+            return
+
+        for name in missing:
+            setattr(self, name, {'all': self.epw_weather[name]})
+
+        # Series given as inputs have to cover the same hours as the series from the EPW file
+        epw_length = len(self.epw_weather['hour_of_year'])
+        if not epw_length:
+            self.add_warning('No hours of the EPW file are within StartTime and EndTime')
+
+        for name, value in parameters.items():
+            if not value:
+                continue
+
+            if isinstance(value, weather_field.WeatherField):
+                length = len(value.station_series[0])
+            else:
+                length = len(next(iter(value.values())))
+
+            if length != epw_length:
+                self.add_warning(name + ' has ' + str(length) + ' values, but ' + str(epw_length) +
+                                 ' hours are read from the EPW file')
+
     def convert_cloud_cover(self):
         """
         | Converts cloud cover to sun shine fraction.
         | Sun shine = 1 - cloud cover
+        | The conversion is applied when the weather is read from the case, see livestock.lib.weather_store.
 
-        :return: list with sun shine fractions.
+        :return: Scale and offset of the conversion.
+        :rtype: tuple
         """
 
-        if self.cloud_cover:
-            sun_shine = {}
-
-            for cloud_key in self.cloud_cover.keys():
-                sun_shine[cloud_key] = []
-                for cc in self.cloud_cover[cloud_key]:
-                    sun_shine[cloud_key].append(1 - float(cc))
-
-            return sun_shine
+        return -1.0, 1.0
 
     def convert_radiation_unit(self):
         """
@@ -603,38 +784,26 @@ class CMFWeather(GHComponent):
         | 1 W/m\ :sup:`2` => 60s * 60min * 24hours/10\ :sup:`6` => MJ/(m\ :sup:`2` day)
         | 1 W/m\ :sup:`2` = 0.0864 MJ/(m\ :sup:`2` day)
 
+        :return: Scale and offset of the conversion.
+        :rtype: tuple
         """
 
-        if self.global_radiation:
-            converted_radiation = {}
-
-            for radiation_key in self.global_radiation.keys():
-                converted_radiation[radiation_key] = []
-                for rad in self.global_radiation[radiation_key]:
-                    converted_radiation[radiation_key].append(float(rad) * 0.0864)
-
-            self.global_radiation = converted_radiation
+        return 0.0864, 0.0
 
     def convert_rain_unit(self):
         """
         | Converts rain from mm/h to mm/day
         | 1 mm/h = 24 mm/day
 
+        :return: Scale and offset of the conversion.
+        :rtype: tuple
         """
 
-        if self.rain:
-            converted_rain = {}
-
-            for rain_key in self.rain.keys():
-                converted_rain[rain_key] = []
-                for rain in self.rain[rain_key]:
-                    converted_rain[rain_key].append(float(rain) * 24)
-
-            self.rain = converted_rain
+        return 24.0, 0.0
 
     def convert_location(self):
         """
-        Extracts information from a Ladybug Tools location
+        Extracts information from a Ladybug Tools location or from the location of the EPW file.
 
         :return: Latitude, longitude and time zone
         """
@@ -644,52 +813,50 @@ class CMFWeather(GHComponent):
 
             return latitude, longitude, time_zone
 
+        elif self.epw_weather and self.epw_weather['location']:
+            location = self.epw_weather['location']
+
+            return location['latitude'], location['longitude'], location['time_zone']
+
         else:
-            self.add_warning('Component needs a Ladybug Location to run')
+            self.add_warning('Component needs a Ladybug Location or an EPW file to run')
             return None, None, None
 
     def match_cell_count(self, weather_parameter):
         """
         Checks whether a whether a weather parameter has the correct number of sublists,
-        so they matches the number of cells. Then converts it into a dict with a list for each cell.
+        so they matches the number of cells. Then converts it into a dict with a float array for each cell.
+        A parameter with a list per weather station is returned as a weather field. A list per cell takes precedence,
+        if the number of stations equals the number of cells.
 
         :param weather_parameter: Weather parameter to check.
         :return: Corrected weather parameter as dict.
         """
 
-        def find_list(weather_list_):
-            if weather_list_:
-                cleaned_list = []
-
-                for element in weather_list_:
-                    if isinstance(element, list):
-                        cleaned_list.append(element)
-                    else:
-                        pass
+        if weather_parameter:
+            values, offsets, paths = gh_misc.tree_to_flat(weather_parameter)
 
-                if len(cleaned_list) == 1:
-                    return cleaned_list
-                else:
-                    return cleaned_list
-            else:
-                return None
+            if not isinstance(values, array):
+                values = array('d', [float(value) for value in values])
 
-        if weather_parameter:
-            weather_list = gh_misc.tree_to_list(weather_parameter)
-            clean_weather_list = find_list(weather_list)
+            weather_list = [values[offsets[i]:offsets[i + 1]]
+                            for i in range(len(offsets) - 1)]
             weather_dict = {}
 
-            if not clean_weather_list:
+            if not weather_list:
                 return None
 
-            elif len(clean_weather_list) == 1:
-                weather_dict['all'] = clean_weather_list[0]
+            elif len(weather_list) == 1:
+                weather_dict['all'] = weather_list[0]
 
             elif len(weather_list) == self.face_count:
                 for i in range(0, len(weather_list)):
                     cell_number = 'cell_' + str(i)
                     weather_dict[cell_number] = weather_list[i]
 
+            elif self.station_weights and len(weather_list) == self.station_count:
+                return weather_field.WeatherField(self.station_weights, weather_list)
+
             return weather_dict
 
         else:
@@ -732,22 +899,23 @@ class CMFWeather(GHComponent):
             self.print_weather_lengths()
 
             # Convertions
-            sun = self.convert_cloud_cover()
-            self.convert_rain_unit()
-            self.convert_radiation_unit()
+            transforms = {'sun': self.convert_cloud_cover(),
+                          'rad': self.convert_radiation_unit(),
+                          'rain': self.convert_rain_unit()}
             latitude, longitude, time_zone = self.convert_location()
 
             # Construct dict
             weather_dict = {'temp': self.temp,
                             'wind': self.wind,
                             'rel_hum': self.rel_hum,
-                            'sun': sun,
+                            'sun': self.cloud_cover,
                             'rad': self.global_radiation,
                             'rain': self.rain,
                             'ground_temp': self.ground_temp,
                             'latitude': latitude,
                             'longitude': longitude,
-                            'time_zone': time_zone}
+                            'time_zone': time_zone,
+                            'transforms': transforms}
 
             self.results = gh_misc.PassClass(weather_dict, 'Weather')
 
@@ -1397,40 +1565,30 @@ class CMFSolve(GHComponent):
         """
 
         # Helper functions
-        def write_weather(weather_dict, folder):
-
-            # Write json file
-            weather_file = 'weather.json'
-            with open(folder + '/' + weather_file, 'w') as outfile:
-                json.dump(weather_dict.c, outfile)
+        def write_weather(weather_dict, writer):
 
-            return weather_file
+            # Write deduplicated weather series and their index
+            return weather_store.write_weather(weather_dict.c, writer)
 
-        def write_ground(ground_dict_, folder):
+        def write_ground(ground_dict_, writer):
 
             # Process ground
             ground_dict = [ground.c
                            for ground in ground_dict_]
 
-            # Copy meshes
-            tmp_folder = os.path.join(tempfile.gettempdir(), 'livestock')
+            # Place meshes
             meshes = []
             for ground in ground_dict:
-                mesh_name = ground['mesh'] + '.obj'
-                tmp_mesh = os.path.join(tmp_folder, mesh_name)
-                case_mesh = os.path.join(self.case_path,
-                                         mesh_name)
-                shutil.copyfile(tmp_mesh, case_mesh)
-                meshes.append(mesh_name)
+                placed = mesh_store.place_mesh(ground['mesh'], self.case_path)
+                meshes.extend(writer.keep(os.path.basename(path))
+                              for path in placed)
 
             # Write json file
-            ground_file = 'ground.json'
-            with open(folder + '/' + ground_file, 'w') as outfile:
-                json.dump(ground_dict, outfile)
+            ground_file = writer.write_json('ground.json', ground_dict)
 
             return [ground_file, ] + meshes
 
-        def write_trees(tree_dict_, folder):
+        def write_trees(tree_dict_, writer):
             # Process trees
 
             tree_dict = list(tree.c for tree in tree_dict_)
@@ -1449,21 +1607,15 @@ class CMFSolve(GHComponent):
                         data.text = str(data_to_write)
 
             tree_tree = ET.ElementTree(tree_root)
-            tree_file = 'trees.xml'
-            tree_tree.write(folder + '/' + tree_file, xml_declaration=True)
 
-            return tree_file
+            return writer.write_xml('trees.xml', tree_tree)
 
-        def write_outputs(output_dict, folder):
+        def write_outputs(output_dict, writer):
 
             # Write json file
-            output_file = 'outputs.json'
-            with open(folder + '/' + output_file, 'w') as outfile:
-                json.dump(output_dict, outfile)
+            return writer.write_json('outputs.json', output_dict)
 
-            return output_file
-
-        def write_boundary_conditions(boundary_dict_, folder):
+        def write_boundary_conditions(boundary_dict_, writer):
             # Process boundary conditions
             boundary_conditions_dict = list(bc.c
                                             for bc in boundary_dict_)
@@ -1510,20 +1662,13 @@ class CMFSolve(GHComponent):
                     bc_flux.text = str(boundary_conditions_dict[i]['location'])
 
             boundary_conditions_tree = ET.ElementTree(boundary_conditions_root)
-            boundary_condition_file = 'boundary_condition.xml'
-            boundary_conditions_tree.write(
-                folder + '/' + boundary_condition_file, xml_declaration=True)
 
-            return boundary_condition_file
+            return writer.write_xml('boundary_condition.xml', boundary_conditions_tree)
 
-        def write_solver_info(solver_dict, folder):
+        def write_solver_info(solver_dict, writer):
 
             # Write json file
-            solver_file = 'solver.json'
-            with open(folder + '/' + solver_file, 'w') as outfile:
-                json.dump(solver_dict, outfile)
-
-            return solver_file
+            return writer.write_json('solver.json', solver_dict)
 
         def write_ssh_files(files_written_):
             # Clean SSH folder
@@ -1546,30 +1691,33 @@ class CMFSolve(GHComponent):
 
             return ssh_command
 
-        # check if folder exists
-        if os.path.exists(self.case_path):
-            shutil.rmtree(self.case_path)
-            os.mkdir(self.case_path)
-        else:
-            os.mkdir(self.case_path)
+        # Only changed files are rewritten and files, which are no longer part of the case, are removed.
+        # weather.json is expanded from the weather store by the solver, so it is removed when the case changes.
+        case_writer = CaseWriter(self.case_path, generated=[weather_store.weather_name])
 
         # Append to files written
         files_written = list()
-        files_written.append(write_ground(self.ground, self.case_path))
-        files_written.append(write_outputs(self.output_config, self.case_path))
-        files_written.append(write_solver_info(self.solver_settings, self.case_path))
+        files_written.extend(write_ground(self.ground, case_writer))
+        files_written.append(write_outputs(self.output_config, case_writer))
+        files_written.append(write_solver_info(self.solver_settings, case_writer))
 
         if self.trees:
-            files_written.append(write_trees(self.trees, self.case_path))
+            files_written.append(write_trees(self.trees, case_writer))
 
         if self.boundary_conditions:
-            files_written.append(write_boundary_conditions(self.boundary_conditions, self.case_path))
+            files_written.append(write_boundary_conditions(self.boundary_conditions, case_writer))
 
         if self.weather:
-            files_written.append(write_weather(self.weather, self.case_path))
+            files_written.extend(write_weather(self.weather, case_writer))
 
         # template
-        pick_template('cmf', self.case_path)
+        case_writer.write_text('cmf_template.py', templates.cmf_template_text(self.case_path))
+
+        case_writer.finish()
+
+        if case_writer.changed:
+            # Results of the old case are outdated
+            self.remove_results()
 
         # ssh
         if self.ssh:
@@ -1584,6 +1732,17 @@ class CMFSolve(GHComponent):
 
         return True
 
+    def remove_results(self):
+        """Removes the results and the result store of the case."""
+
+        result_path = os.path.join(self.case_path, 'results.json')
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+        store_path = result_store.store_folder(result_path)
+        if os.path.exists(store_path):
+            shutil.rmtree(store_path)
+
     def do_case(self):
         """Spawns a new subprocess, that runs the ssh template."""
 
@@ -1680,6 +1839,64 @@ class CMFResults(GHComponent):
                         'description': 'Run component',
                         'access': 'item',
                         'default_value': False},
+
+                    4: {'name': 'StartTime',
+                        'description': 'First time to load. Either a time step index or a date and time.'
+                                       '\nDefault is the first time step',
+                        'access': 'item',
+                        'default_value': None},
+
+                    5: {'name': 'EndTime',
+                        'description': 'Last time to load. Either a time step index or a date and time.'
+                                       '\nDefault is the last time step',
+                        'access': 'item',
+                        'default_value': None},
+
+                    6: {'name': 'Stride',
+                        'description': 'Load every n\'th time step.'
+                                       '\nDefault is 1',
+                        'access': 'item',
+                        'default_value': 1},
+
+                    7: {'name': 'Cells',
+                        'description': 'Cell indices to load or a list with a boolean for each cell.'
+                                       '\nDefault is all cells',
+                        'access': 'list',
+                        'default_value': None},
+
+                    8: {'name': 'Aggregate',
+                        'description': 'Reduce the result of each cell to a single value:'
+                                       '\n0 - No aggregation. Output the full series'
+                                       '\n1 - Minimum'
+                                       '\n2 - Maximum'
+                                       '\n3 - Mean'
+                                       '\n4 - Sum'
+                                       '\n5 - Percentile'
+                                       '\n6 - Time step of the peak value'
+                                       '\nDefault is 0',
+                        'access': 'item',
+                        'default_value': 0},
+
+                    9: {'name': 'Percentile',
+                        'description': 'Percentile between 0 and 100 used when Aggregate is set to 5.'
+                                       '\nDefault is 95',
+                        'access': 'item',
+                        'default_value': 95},
+
+                    10: {'name': 'Points',
+                         'description': 'Downsample each series to at most this number of points for plotting. '
+                                        'Not used together with Aggregate.'
+                                        '\nDefault is no downsampling',
+                         'access': 'item',
+                         'default_value': None},
+
+                    11: {'name': 'DownsampleMethod',
+                         'description': 'How to downsample the series:'
+                                        '\n0 - Largest-Triangle-Three-Buckets. Keeps the visual shape'
+                                        '\n1 - Minimum and maximum of each bucket. Keeps the envelope'
+                                        '\nDefault is 0',
+                         'access': 'item',
+                         'default_value': 0},
                     }
 
         def outputs():
@@ -1690,6 +1907,9 @@ class CMFResults(GHComponent):
 
                     2: {'name': 'Values',
                         'description': 'List with chosen result values'},
+
+                    3: {'name': 'TimeSteps',
+                        'description': 'Time step index of each value, when the results are downsampled'},
                     }
 
         # Component Config
@@ -1704,7 +1924,16 @@ class CMFResults(GHComponent):
         self.path = None
         self.fetch_result = None
         self.run_component = None
+        self.start = None
+        self.end = None
+        self.stride = None
+        self.cells = None
+        self.aggregate = None
+        self.percentile = None
+        self.points = None
+        self.downsample_method = None
         self.results = None
+        self.time_steps = None
 
     def check_inputs(self):
         """
@@ -1713,19 +1942,67 @@ class CMFResults(GHComponent):
 
         self.checks = True
 
+        self.check_aggregate()
+
+        if self.points:
+            self.check_downsampling()
+
+    def check_aggregate(self):
+        """Checks the aggregation inputs."""
+
+        try:
+            aggregate = int(self.aggregate)
+        except (TypeError, ValueError):
+            aggregate = None
+
+        if aggregate not in range(7):
+            self.add_warning('Aggregate has to be between 0 and 6. Got: ' + str(self.aggregate))
+            self.checks = False
+
+        elif aggregate == 5 and not 0 <= float(self.percentile) <= 100:
+            self.add_warning('Percentile has to be between 0 and 100. Got: ' + str(self.percentile))
+            self.checks = False
+
+    def check_downsampling(self):
+        """Checks the downsampling inputs and converts the downsampling method input to a method name."""
+
+        methods = ('lttb', 'min_max')
+        minimum_points = {'lttb': 3, 'min_max': 2}
+
+        try:
+            self.downsample_method = methods[int(self.downsample_method)]
+        except (IndexError, TypeError, ValueError):
+            self.add_warning('DownsampleMethod has to be 0 or 1. Got: ' + str(self.downsample_method))
+            self.checks = False
+            return
+
+        if int(self.points) < minimum_points[self.downsample_method]:
+            self.add_warning('Points has to be at least ' + str(minimum_points[self.downsample_method]) +
+                             ' for this DownsampleMethod. Got: ' + str(self.points))
+            self.checks = False
+
     def config(self):
         """Generates the Grasshopper component."""
 
         # Generate Component
         self.config_component(self.component_number)
 
-    def run_checks(self, path, fetch_result, run):
+    def run_checks(self, path, fetch_result, run, start=None, end=None, stride=None, cells=None, aggregate=None,
+                   percentile=None, points=None, downsample_method=None):
         """
         Gathers the inputs and checks them.
 
         :param path: Result path
         :param fetch_result: Which result to fetch
         :param run: Whether to run the component or not.
+        :param start: First time step or time to load.
+        :param end: Last time step or time to load.
+        :param stride: Load every n'th time step.
+        :param cells: Cell indices or cell mask to load.
+        :param aggregate: Which aggregation to apply to the result of each cell.
+        :param percentile: Percentile used by the percentile aggregation.
+        :param points: Number of points to downsample each series to.
+        :param downsample_method: Which downsampling method to use.
         """
 
         # Gather data
@@ -1735,10 +2012,33 @@ class CMFResults(GHComponent):
             self.path = None
         self.fetch_result = self.add_default_value(fetch_result, 1)
         self.run_component = self.add_default_value(run, 3)
+        self.start = self.convert_time(start)
+        self.end = self.convert_time(end)
+        self.stride = self.add_default_value(stride, 6)
+        self.cells = self.add_default_value(cells, 7)
+        self.aggregate = self.add_default_value(aggregate, 8)
+        if percentile is None or percentile == '':
+            self.percentile = self.inputs[9]['default_value']
+        else:
+            self.percentile = percentile
+        self.points = self.add_default_value(points, 10)
+        self.downsample_method = self.add_default_value(downsample_method, 11)
 
         # Run checks
         self.check_inputs()
 
+    @staticmethod
+    def convert_time(time):
+        """Converts a time input to a time step index, if it is a number. Dates and times are passed on as they are."""
+
+        if time is None or time == '':
+            return None
+
+        try:
+            return int(time)
+        except (TypeError, ValueError):
+            return time
+
     def set_fetch_result(self):
         """Function to organize the output units."""
 
@@ -1778,18 +2078,66 @@ class CMFResults(GHComponent):
             self.fetch_result = 'wetness'
             self.unit = '-'
 
+    def set_aggregate(self):
+        """Converts the aggregation input to an aggregation method."""
+
+        methods = {1: 'min',
+                   2: 'max',
+                   3: 'mean',
+                   4: 'sum',
+                   5: 'percentile',
+                   6: 'peak_time'}
+
+        self.aggregate = methods.get(int(self.aggregate))
+
+        if self.aggregate == 'peak_time':
+            self.unit = 'time step'
+
     def run(self):
         """
         In case all the checks have passed and run is True the component runs.
-        Following functions are run: set_units(), load_cmf_result_file()
+        Following functions are run: set_units(), set_aggregate() and load_cmf_results(), aggregate_cmf_results() or
+        downsample_cmf_results()
         The results are converted into a Grasshopper Tree structure.
         """
 
+        # The time steps are only given by downsampling. Clear them, so they do not outlive an earlier downsampling.
+        self.time_steps = None
+
         if self.checks and self.run_component:
             self.set_fetch_result()
-            results = cmf_lib.load_cmf_result_file(self.path,
-                                                   self.fetch_result)
-            self.results = gh_misc.list_to_tree(results)
+            self.set_aggregate()
+
+            if self.aggregate:
+                results = cmf_lib.aggregate_cmf_results(self.path,
+                                                        self.fetch_result,
+                                                        self.aggregate,
+                                                        self.cells,
+                                                        self.start,
+                                                        self.end,
+                                                        self.stride,
+                                                        float(self.percentile))
+
+            elif self.points:
+                results, time_steps = cmf_lib.downsample_cmf_results(self.path,
+                                                                     self.fetch_result,
+                                                                     int(self.points),
+                                                                     self.downsample_method,
+                                                                     self.cells,
+                                                                     self.start,
+                                                                     self.end,
+                                                                     self.stride)
+                self.time_steps = gh_misc.arrays_to_tree(time_steps)
+
+            else:
+                results = cmf_lib.load_cmf_results(self.path,
+                                                   self.fetch_result,
+                                                   self.cells,
+                                                   self.start,
+                                                   self.end,
+                                                   self.stride)
+
+            self.results = gh_misc.arrays_to_tree(results)
 
 
 class CMFOutputs(GHComponent):
@@ -2017,7 +2365,19 @@ class CMFInlet(GHComponent):
                                        ' e.g. 1/60 equals time steps of 1 min.\n'
                                        'Default is 1 hour.',
                         'access': 'item',
-                        'default_value': 1}
+                        'default_value': 1},
+
+                    4: {'name': 'Location',
+                        'description': 'Location of the inlet in x, y and z coordinates.\n'
+                                       'Only used together with Mesh.',
+                        'access': 'item',
+                        'default_value': None},
+
+                    5: {'name': 'Mesh',
+                        'description': 'Ground mesh of the case. If given together with Location, '
+                                       'ConnectedCell is set to the mesh face closest to Location.',
+                        'access': 'item',
+                        'default_value': None}
                     }
 
         def outputs():
@@ -2036,6 +2396,8 @@ class CMFInlet(GHComponent):
         self.layer = None
         self.inlet_flux = None
         self.time_step = None
+        self.location = None
+        self.mesh = None
         self.checks = False
         self.results = None
 
@@ -2055,7 +2417,7 @@ class CMFInlet(GHComponent):
         # Generate Component
         self.config_component(self.component_number)
 
-    def run_checks(self, cell, layer, inlet_flux, time_step):
+    def run_checks(self, cell, layer, inlet_flux, time_step, location=None, mesh=None):
         """
         Gathers the inputs and checks them.
 
@@ -2063,6 +2425,8 @@ class CMFInlet(GHComponent):
         :param layer:
         :param inlet_flux:
         :param time_step:
+        :param location: Location of the inlet.
+        :param mesh: Ground mesh to find the closest cell in.
         :return:
         """
 
@@ -2071,6 +2435,11 @@ class CMFInlet(GHComponent):
         self.layer = self.add_default_value(int(layer), 1)
         self.inlet_flux = self.add_default_value(inlet_flux, 2)
         self.time_step = self.add_default_value(time_step, 3)
+        self.location = self.add_default_value(location, 4)
+        self.mesh = self.add_default_value(mesh, 5)
+
+        if self.mesh and self.location:
+            self.cell = gh_geo.closest_cell(self.mesh, self.location)
 
         # Run checks
         self.check_inputs()
@@ -2416,12 +2785,12 @@ class CMFSurfaceFluxResult(GHComponent):
 
         # helper functions
         def process_mesh(mesh_, path_):
-            points = rs.MeshFaceCenters(mesh_)
+            points = gh_geo.mesh_face_metrics(mesh_)['centroid']
 
             point_obj = open(path_ + '/center_points.txt', 'w')
-            for point in points:
+            for i in range(0, len(points), 3):
                 point_obj.write(','.join(str(element)
-                                         for element in point) + '\n'
+                                         for element in points[i:i + 3]) + '\n'
                                 )
 
             point_obj.close()
@@ -2553,6 +2922,12 @@ class CMFOutlet(GHComponent):
                                        'If Technical Flux:\n'
                                        '    Maximum Flux - The maximum flux is in m3/day.',
                         'access': 'item',
+                        'default_value': None},
+
+                    5: {'name': 'Mesh',
+                        'description': 'Ground mesh of the case. If given, ConnectedCell is set to the mesh face '
+                                       'closest to Location.',
+                        'access': 'item',
                         'default_value': None}
 
                     }
@@ -2570,6 +2945,7 @@ class CMFOutlet(GHComponent):
         self.description = 'Create a CMF Outlet'
         self.component_number = 29
         self.location = None
+        self.mesh = None
         self.cell = None
         self.layer = None
         self.outlet_type = None
@@ -2589,7 +2965,7 @@ class CMFOutlet(GHComponent):
         # Generate Component
         self.config_component(self.component_number)
 
-    def run_checks(self, location, cell, layer, type_, type_parameter):
+    def run_checks(self, location, cell, layer, type_, type_parameter, mesh=None):
         """
         Gathers the inputs and checks them.
 
@@ -2598,6 +2974,7 @@ class CMFOutlet(GHComponent):
         :param layer: Layer of cell to connect to. 0 is surface water.
         :param type_: Type of connection from CMF Outlet Type
         :param type_parameter: Parameter for the connection type.
+        :param mesh: Ground mesh to find the closest cell in.
         """
 
         # Gather data
@@ -2606,6 +2983,10 @@ class CMFOutlet(GHComponent):
         self.layer = self.add_default_value(int(layer), 2)
         self.outlet_type = self.add_default_value(type_, 3)
         self.parameter = self.add_default_value(type_parameter, 4)
+        self.mesh = self.add_default_value(mesh, 5)
+
+        if self.mesh:
+            self.cell = gh_geo.closest_cell(self.mesh, self.location)
 
         # Run checks
         self.check_inputs()
@@ -2665,3 +3046,177 @@ class CMFOutlet(GHComponent):
 
         if self.checks:
             self.set_outlet()
+
+
+class CMFCompareResults(CMFResults):
+    """A component class that compares the results of two CMF cases."""
+
+    def __init__(self, ghenv):
+        GHComponent.__init__(self, ghenv)
+
+        def inputs():
+            return {0: component.inputs('required'),
+
+                    1: {'name': 'BaseFolder',
+                        'description': 'Path to the result folder of the base case. '
+                                       'Accepts output from Livestock Solve.',
+                        'access': 'item',
+                        'default_value': None},
+
+                    2: {'name': 'VariantFolder',
+                        'description': 'Path to the result folder of the case to compare with the base case. '
+                                       'Accepts output from Livestock Solve.',
+                        'access': 'item',
+                        'default_value': None},
+
+                    3: {'name': 'FetchResult',
+                        'description': 'Choose which result should be compared:'
+                                       '\n0 - Evapotranspiration'
+                                       '\n1 - Surface water volume'
+                                       '\n2 - Surface water flux'
+                                       '\n3 - Heat flux'
+                                       '\n4 - Soil layer water flux'
+                                       '\n5 - Soil layer potential'
+                                       '\n6 - Soil layer theta'
+                                       '\n7 - Soil layer volume'
+                                       '\n8 - Soil layer wetness',
+                        'access': 'item',
+                        'default_value': 1},
+
+                    4: {'name': 'Run',
+                        'description': 'Run component',
+                        'access': 'item',
+                        'default_value': False},
+
+                    5: {'name': 'StartTime',
+                        'description': 'First time to compare. Either a time step index or a date and time.'
+                                       '\nDefault is the first time step',
+                        'access': 'item',
+                        'default_value': None},
+
+                    6: {'name': 'EndTime',
+                        'description': 'Last time to compare. Either a time step index or a date and time.'
+                                       '\nDefault is the last time step',
+                        'access': 'item',
+                        'default_value': None},
+
+                    7: {'name': 'Stride',
+                        'description': 'Compare every n\'th time step.'
+                                       '\nDefault is 1',
+                        'access': 'item',
+                        'default_value': 1},
+
+                    8: {'name': 'Cells',
+                        'description': 'Cell indices to compare or a list with a boolean for each cell.'
+                                       '\nDefault is all cells',
+                        'access': 'list',
+                        'default_value': None},
+                    }
+
+        def outputs():
+            return {0: component.outputs('readme'),
+
+                    1: {'name': 'Units',
+                        'description': 'Shows the units of the differences'},
+
+                    2: {'name': 'Difference',
+                        'description': 'Variant minus base for each cell and time step'},
+
+                    3: {'name': 'Ratio',
+                        'description': 'Variant divided by base for each cell and time step. '
+                                       'NaN where the base is 0'},
+
+                    4: {'name': 'RMSE',
+                        'description': 'Root mean square difference of each cell'},
+
+                    5: {'name': 'TimeSteps',
+                        'description': 'Time step indices of the base case, which are compared'},
+                    }
+
+        # Component Config
+        self.inputs = inputs()
+        self.outputs = outputs()
+        self.component_number = 30
+        self.description = 'Compare the results of two CMF cases'
+        self.checks = False
+
+        # Data Parameters
+        self.unit = None
+        self.path = None
+        self.variant_path = None
+        self.fetch_result = None
+        self.run_component = None
+        self.start = None
+        self.end = None
+        self.stride = None
+        self.cells = None
+        self.difference = None
+        self.ratio = None
+        self.rmse = None
+        self.time_steps = None
+
+    def check_inputs(self):
+        """
+        Checks inputs and raises a warning if an input is not the correct type.
+        """
+
+        if self.path and self.variant_path:
+            self.checks = True
+        else:
+            self.add_warning('Both a base and a variant result folder are needed.')
+            self.checks = False
+
+    def run_checks(self, base_path, variant_path, fetch_result, run, start=None, end=None, stride=None, cells=None):
+        """
+        Gathers the inputs and checks them.
+
+        :param base_path: Result path of the base case.
+        :param variant_path: Result path of the variant case.
+        :param fetch_result: Which result to compare.
+        :param run: Whether to run the component or not.
+        :param start: First time step or time to compare.
+        :param end: Last time step or time to compare.
+        :param stride: Compare every n'th time step.
+        :param cells: Cell indices or cell mask to compare.
+        """
+
+        # Gather data
+        if base_path:
+            self.path = os.path.join(base_path, 'results.json')
+        else:
+            self.path = None
+        if variant_path:
+            self.variant_path = os.path.join(variant_path, 'results.json')
+        else:
+            self.variant_path = None
+        self.fetch_result = int(self.add_default_value(fetch_result, 3))
+        self.run_component = self.add_default_value(run, 4)
+        self.start = self.convert_time(start)
+        self.end = self.convert_time(end)
+        self.stride = self.add_default_value(stride, 7)
+        self.cells = self.add_default_value(cells, 8)
+
+        # Run checks
+        self.check_inputs()
+
+    def run(self):
+        """
+        In case all the checks have passed and run is True the component runs.
+        Following functions are run: set_fetch_result(), compare_cmf_results()
+        The comparisons are converted into Grasshopper Tree structures.
+        """
+
+        if self.checks and self.run_component:
+            self.set_fetch_result()
+            comparison = cmf_lib.compare_cmf_results(self.path,
+                                                     self.variant_path,
+                                                     self.fetch_result,
+                                                     self.cells,
+                                                     self.start,
+                                                     self.end,
+                                                     self.stride)
+
+            self.difference = gh_misc.arrays_to_tree(comparison['difference'])
+            self.ratio = gh_misc.arrays_to_tree(comparison['ratio'])
+            self.rmse = gh_misc.arrays_to_tree(comparison['rmse'])
+            self.time_steps = list(comparison['time_steps'])
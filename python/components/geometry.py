@@ -134,6 +134,18 @@ class SaveMesh(GHComponent):
                         'description': 'Additional data if any',
                         'access': 'item',
                         'default_value': None},
+
+                    7: {'name': 'Precision',
+                        'description': 'Number of decimals to write the vertex coordinates with.\n'
+                                       'Default is full precision',
+                        'access': 'item',
+                        'default_value': None},
+
+                    8: {'name': 'Compress',
+                        'description': 'Gzip the .obj file.\n'
+                                       'Default is False',
+                        'access': 'item',
+                        'default_value': False},
                     }
 
         def outputs():
@@ -152,6 +164,8 @@ class SaveMesh(GHComponent):
         self.dir = None
         self.name = None
         self.save = None
+        self.precision = None
+        self.compress = None
 
     def check_inputs(self):
         """Checks inputs and raises a warning if an input is not the correct type."""
@@ -164,7 +178,7 @@ class SaveMesh(GHComponent):
         # Generate Component
         self.config_component(self.component_number)
 
-    def run_checks(self, mesh, dir_, name, save, data):
+    def run_checks(self, mesh, dir_, name, save, data, precision=None, compress=False):
         """
         Gathers the inputs and checks them.
 
@@ -173,6 +187,8 @@ class SaveMesh(GHComponent):
         :param dir_: Directory where the files should be saved.
         :param name: Name for mesh.
         :param save: Whether to save or not.
+        :param precision: Number of decimals for the vertex coordinates.
+        :param compress: Whether to gzip the .obj file or not.
         """
 
         # Gather data
@@ -181,6 +197,8 @@ class SaveMesh(GHComponent):
         self.dir = dir_
         self.name = name
         self.save = self.add_default_value(save, 4)
+        self.precision = self.add_default_value(precision, 7)
+        self.compress = self.add_default_value(compress, 8)
 
         # Run checks
         self.check_inputs()
@@ -193,8 +211,8 @@ class SaveMesh(GHComponent):
 
         if self.checks and self.save:
             # Export mesh
-            path = os.path.join(self.dir, self.name + '.obj')
-            gh_geo.obj_export(self.mesh, path)
+            path = os.path.join(self.dir, self.name)
+            path = gh_geo.obj_export(self.mesh, path, self.precision, self.compress)
 
             if os.path.exists(path):
                 print("Mesh saved to:" + path)
@@ -6,6 +6,7 @@ __license__ = "GNU GPLv3"
 
 # Module imports
 from System.Diagnostics import Process
+from shutil import copyfile
 import os
 
 # Livestock imports
@@ -76,8 +77,8 @@ class MeshDrainPaths(GHComponent):
         self.outputs = outputs()
         self.description = 'Simulates drainage paths on a surface mesh. ' \
                            'The paths are based on a geometric computation, ' \
-                           'which looks for the lowest neighbouring mesh face' \
-                           ' as the location for where to the water will run.'
+                           'which looks for the neighbouring mesh face with the ' \
+                           'steepest descent as the location for where to the water will run.'
         self.component_number = 2
         self.checks = False
         self.results = {'drain_curves': None, 'end_points': None, }
@@ -131,8 +132,7 @@ class MeshDrainPaths(GHComponent):
         files_written.append('drain_mesh_template.py')
 
         # Export mesh
-        gh_geo.bake_export_delete(self.mesh, self.case_path,
-                                  'drain_mesh', '.obj', doc_)
+        gh_geo.export_mesh(self.mesh, self.case_path, 'drain_mesh', doc_)
         files_written.append('drain_mesh.obj')
 
         # Write cpu file
@@ -141,7 +141,7 @@ class MeshDrainPaths(GHComponent):
 
         # SSH commands
         if self.ssh:
-            ssh_cmd = write_ssh_files(files_written)
+            ssh_cmd = self.write_ssh_files(files_written)
             ssh.write_ssh_commands(ssh_cmd)
         else:
             pick_template('drain_mesh', self.case_path)
@@ -168,6 +168,17 @@ class MeshDrainPaths(GHComponent):
 
         return ssh_command
 
+    def compute_paths(self):
+        """Traces the drainage paths locally with the Livestock drainage engine."""
+
+        path_offsets, path_faces, centroids = gh_geo.mesh_drain_paths(self.mesh, self.cpus)
+        pts = gh_geo.paths_to_points(path_offsets, path_faces, centroids)
+
+        (self.results['drain_curves'],
+         self.results['end_points']) = gh_geo.make_curves_from_points(pts)
+
+        return True
+
     def do_case(self):
         """Spawns a new subprocess, that runs the ssh template."""
 
@@ -198,11 +209,22 @@ class MeshDrainPaths(GHComponent):
          self.results['end_points']) = gh_geo.make_curves_from_points(pts)
 
     def run(self, doc):
+        """
+        | In case all the checks have passed and Run is True the component runs.
+        | Locally the paths are traced with compute_paths().
+        | Through SSH the files are written and the template is run on the server.
+
+        """
+
         if self.checks and self.run_component:
 
-            # Write files and run template
-            self.write(doc)
-            self.do_case()
+            if self.ssh:
+                # Write files and run template
+                self.write(doc)
+                self.do_case()
+
+                # Load result files and delete files afterwards
+                self.load_results()
 
-            # Load result files and delete files afterwards
-            self.load_results()
+            else:
+                self.compute_paths()
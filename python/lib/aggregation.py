@@ -0,0 +1,87 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+import math
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Aggregation
+#
+# Reductions of time series to a single value. The series are sequences of floats, e.g. the float arrays read from
+# a result store, so a whole case can be aggregated while holding only one series in memory at a time.
+
+methods = ('min', 'max', 'mean', 'sum', 'percentile', 'peak_time')
+
+
+def aggregate(series, method, percentile=95):
+    """
+    Reduces a time series to a single value.
+
+    :param series: Sequence of floats.
+    :param method: One of: min, max, mean, sum, percentile or peak_time. peak_time is the index of the maximum.
+    :param percentile: Percentile between 0 and 100. Only used by the percentile method.
+    :return: Reduced value. None for an empty series.
+    :rtype: float
+    """
+
+    if method not in methods:
+        raise KeyError('Unknown aggregation method: ' + str(method) + '. Use one of: ' + ', '.join(methods))
+
+    if not len(series):
+        return None
+
+    if method == 'min':
+        return min(series)
+
+    elif method == 'max':
+        return max(series)
+
+    elif method == 'mean':
+        return math.fsum(series) / len(series)
+
+    elif method == 'sum':
+        return math.fsum(series)
+
+    elif method == 'percentile':
+        return percentile_value(sorted(series), percentile)
+
+    else:
+        return peak_index(series)
+
+
+def percentile_value(sorted_series, percentile):
+    """
+    Finds a percentile of a sorted series by linear interpolation between the closest ranks.
+
+    :param sorted_series: Sorted sequence of floats.
+    :param percentile: Percentile between 0 and 100.
+    :return: Percentile value.
+    :rtype: float
+    """
+
+    if not 0 <= percentile <= 100:
+        raise ValueError('Percentile has to be between 0 and 100. Got: ' + str(percentile))
+
+    rank = (len(sorted_series) - 1) * percentile / 100.0
+    lower = int(math.floor(rank))
+    upper = min(lower + 1, len(sorted_series) - 1)
+    fraction = rank - lower
+
+    return sorted_series[lower] + (sorted_series[upper] - sorted_series[lower]) * fraction
+
+
+def peak_index(series):
+    """Returns the index of the first occurrence of the largest value in a series."""
+
+    peak = max(series)
+
+    for index, value in enumerate(series):
+        if value == peak:
+            return index
@@ -0,0 +1,174 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+import hashlib
+import io
+import json
+import os
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Case Writer
+#
+# Writes the files of a case folder incrementally. The content of every file is hashed before it is written, and the
+# hashes are kept in a manifest (case_manifest.json) in the case folder. A file is only rewritten if its hash has
+# changed. Files are written to a temporary file, which is then moved into place, so a case folder never holds a
+# half written file. Files from the last write, which are not part of the new write, are removed.
+# Files generated from the case files on the solver side, e.g. weather.json, are not part of the manifest. They are
+# removed whenever the case changes, so the solver never runs on files generated from an earlier case.
+
+manifest_name = 'case_manifest.json'
+
+
+class CaseWriter:
+    """
+    | Incremental writer for a case folder.
+    | Write every file of the case with one of the write methods or register it with keep(), then call finish().
+    """
+
+    def __init__(self, folder, generated=()):
+        """
+        :param folder: Case folder. It is created if it does not exist.
+        :param generated: Names of files, which the solver generates from the case files. They are removed, if any file
+                          of the case has been written or removed.
+        """
+
+        self.folder = folder
+        self.generated = list(generated)
+
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.manifest = read_manifest(folder)
+        self.files = {}
+        self.written = []
+        self.unchanged = []
+        self.removed = []
+
+    @property
+    def changed(self):
+        """True if any file has been written or removed."""
+
+        return bool(self.written or self.removed)
+
+    def write_bytes(self, name, content):
+        """
+        Writes a file, unless a file with the same content has already been written.
+
+        :param name: File name in the case folder.
+        :param content: File content as bytes.
+        :return: File name.
+        :rtype: str
+        """
+
+        digest = hashlib.sha1(content).hexdigest()
+        path = os.path.join(self.folder, name)
+
+        if self.manifest.get(name) == digest and os.path.isfile(path):
+            self.unchanged.append(name)
+
+        else:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as file_obj:
+                file_obj.write(content)
+            mesh_io.replace_file(tmp_path, path)
+            self.written.append(name)
+
+        self.files[name] = digest
+
+        return name
+
+    def write_text(self, name, text):
+        """Writes a text file. See write_bytes()."""
+
+        return self.write_bytes(name, text.encode('utf-8'))
+
+    def write_json(self, name, data):
+        """Writes data as a JSON file. See write_bytes()."""
+
+        return self.write_text(name, json.dumps(data, sort_keys=True))
+
+    def write_xml(self, name, tree):
+        """Writes an ElementTree as an XML file. See write_bytes()."""
+
+        buffer_ = io.BytesIO()
+        tree.write(buffer_, xml_declaration=True)
+
+        return self.write_bytes(name, buffer_.getvalue())
+
+    def keep(self, name):
+        """
+        Registers a file, which has been put into the case folder by other means, e.g. a mesh placed from the mesh
+        store, so it is not removed as an orphan.
+
+        :param name: File name in the case folder.
+        :return: File name.
+        :rtype: str
+        """
+
+        self.files[name] = None
+
+        return name
+
+    def finish(self):
+        """
+        Removes the files of the last write, which are not part of this write, and writes the manifest.
+        If the case has changed, the generated files are removed too.
+
+        :return: Names of the removed files.
+        :rtype: list
+        """
+
+        for name in self.manifest:
+            if name in self.files:
+                continue
+
+            path = os.path.join(self.folder, name)
+            if os.path.isfile(path):
+                os.remove(path)
+            self.removed.append(name)
+
+        if self.changed:
+            for name in self.generated:
+                path = os.path.join(self.folder, name)
+                if os.path.isfile(path):
+                    os.remove(path)
+                    self.removed.append(name)
+
+        manifest_path = os.path.join(self.folder, manifest_name)
+        with open(manifest_path + '.tmp', 'w') as manifest_file:
+            json.dump(self.files, manifest_file, indent=2, sort_keys=True)
+        mesh_io.replace_file(manifest_path + '.tmp', manifest_path)
+
+        self.manifest = dict(self.files)
+
+        return self.removed
+
+
+def read_manifest(folder):
+    """
+    Reads the manifest of a case folder.
+
+    :param folder: Case folder.
+    :return: Dict with file name as key and content hash as value. Empty if there is no manifest.
+    :rtype: dict
+    """
+
+    manifest_path = os.path.join(folder, manifest_name)
+
+    if not os.path.isfile(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            return json.load(manifest_file)
+    except ValueError:
+        return {}
@@ -5,13 +5,19 @@ __license__ = "GNU GPLv3"
 # Imports
 
 # Module imports
+from array import array
 import collections
+import math
+import operator
 import os
 import datetime
-import json
 
 # Livestock imports
+import livestock.lib.aggregation as aggregation
+import livestock.lib.downsampling as downsampling
 import livestock.lib.livestock_csv as csv
+import livestock.lib.json_stream as json_stream
+import livestock.lib.result_store as result_store
 
 
 # Grasshopper imports
@@ -121,57 +127,663 @@ def default_outputs():
     return output_dict
 
 
-def load_cmf_result_file(file_path, result_type):
+result_components = {'evapotranspiration': ('evaporation', 'transpiration')}
+
+
+def result_variables(result_types):
+    """
+    Finds the variables in the results file, which are needed for a set of result types.
+
+    :param result_types: Names of the results.
+    :return: Variable names in the order they are first needed.
+    :rtype: list
+    """
+
+    variables = []
+
+    for result_type in result_types:
+        for variable in result_components.get(result_type, (result_type, )):
+            if variable not in result_store.cell_variables and variable not in result_store.layer_variables:
+                raise KeyError('Unknown result: %s to load.' % result_type)
+
+            if variable not in variables:
+                variables.append(variable)
+
+    return variables
+
+
+def combine_results(result_type, variable_results):
+    """
+    Builds a result from the loaded variables. Evapotranspiration is the sum of evaporation and transpiration.
+
+    :param result_type: Name of the result.
+    :param variable_results: Dict with the loaded result of each variable.
+    :return: List with the result of each cell.
+    :rtype: list
+    """
+
+    if result_type not in result_components:
+        return variable_results[result_type]
+
+    parts = [variable_results[variable]
+             for variable in result_components[result_type]]
+
+    return [add_series(cell_parts)
+            for cell_parts in zip(*parts)]
+
+
+def add_series(series):
+    """Adds float arrays together element by element."""
+
+    total = series[0]
+    for other in series[1:]:
+        total = array('d', map(operator.add, total, other))
+
+    return total
+
+
+def stream_cmf_results(file_path, variables, cells=None, chunk_size=2 ** 20):
+    """
+    | Reads a set of variables from a CMF results file in a single pass.
+    | The file is walked once with a JSON stream and everything else than the requested variables is skipped, so the
+    | memory used is proportional to the returned result and not to the file.
+
+    :param file_path: Path to results.json
+    :param variables: Names of the cell and layer variables to read, e.g. surface_water_volume and volume.
+    :param cells: Indices of the cells to read. Default is all cells.
+    :param chunk_size: Number of characters to read from the file at a time.
+    :return: Dict with variable name as key and a list with an entry for each cell as value. The cells are in the order
+             they are given in or ordered by index when all cells are read. Cell variables have a float array per cell
+             and layer variables have a list of float arrays, one per layer.
+    :rtype: dict
+    """
+
+    variables = list(variables)
+    cell_variables = set(variable
+                         for variable in variables
+                         if variable in result_store.cell_variables)
+    layer_variables = set(variable
+                          for variable in variables
+                          if variable in result_store.layer_variables)
+
+    if len(cell_variables) + len(layer_variables) != len(variables):
+        raise KeyError('Unknown result in: %s to load.' % ', '.join(variables))
+
+    if cells is None:
+        positions = {}
+    else:
+        positions = dict((cell, position)
+                         for position, cell in enumerate(cells))
+
+    # Values of each variable and cell. The lists are filled in cell order, when the cells are known up front.
+    values = dict((variable, [None] * len(positions))
+                  for variable in variables)
+    cell_order = []
+
     with open(file_path, 'r') as json_file:
-        result_data = json.load(json_file)
+        stream = json_stream.JsonStream(json_file, chunk_size)
+
+        for cell_key in stream.iter_object():
+            cell = result_store.result_index(cell_key, 'cell')
+
+            if cell is None or (cells is not None and cell not in positions):
+                stream.skip_value()
+                continue
+
+            if cells is None:
+                positions[cell] = len(cell_order)
+                for variable in variables:
+                    values[variable].append(None)
+            cell_order.append(cell)
+            position = positions[cell]
+
+            layers = dict((variable, {})
+                          for variable in layer_variables)
+
+            for key in stream.iter_object():
+                layer = result_store.result_index(key, 'layer')
+
+                if layer is not None and layer_variables:
+                    for layer_key in stream.iter_object():
+                        if layer_key in layer_variables:
+                            layers[layer_key][layer] = stream.read_number_array()
+                        else:
+                            stream.skip_value()
+
+                elif key in cell_variables:
+                    values[key][position] = stream.read_number_array()
+
+                else:
+                    stream.skip_value()
+
+            for variable, cell_layers in layers.items():
+                if cell_layers:
+                    values[variable][position] = [cell_layers[index]
+                                                  for index in sorted(cell_layers)]
+
+    if cells is not None and len(cell_order) != len(positions):
+        raise KeyError('Cells: %s are not in the results file' % sorted(set(positions) - set(cell_order)))
+
+    for variable in variables:
+        missing = [cell
+                   for cell, position in positions.items()
+                   if values[variable][position] is None]
+
+        if len(missing) == len(positions) and positions:
+            raise KeyError('Result: %s was not part of the outputs of the simulation.' % variable)
+        elif missing:
+            raise KeyError('Result: %s is missing for the cells: %s' % (variable, sorted(missing)))
+
+    if cells is None:
+        # Order by cell index
+        order = sorted(range(len(cell_order)), key=lambda position: cell_order[position])
+        for variable in variables:
+            values[variable] = [values[variable][position]
+                                for position in order]
+
+    return values
+
+
+def load_cmf_result_file(file_path, result_type, cells=None):
+    """
+    Loads one or more results from a CMF results file. All results are read in a single pass over the file.
+
+    :param file_path: Path to results.json
+    :param result_type: Name of the result to load or a list of names.
+    :param cells: Indices of the cells to load. Default is all cells.
+    :return: List with the result of each cell, ordered by cell index. If a list of names is given, an ordered dict
+             with the result name as key and the list as value is returned.
+    :rtype: list or collections.OrderedDict
+    """
+
+    if isinstance(result_type, (list, tuple)):
+        result_types = list(result_type)
+    else:
+        result_types = [result_type, ]
+
+    variable_results = stream_cmf_results(file_path, result_variables(result_types), cells)
+    processed_result = collections.OrderedDict((type_, combine_results(type_, variable_results))
+                                               for type_ in result_types)
+
+    if isinstance(result_type, (list, tuple)):
+        return processed_result
+    else:
+        return processed_result[result_type]
+
+
+def load_cmf_results(file_path, result_type, cells=None, start=None, end=None, stride=None, use_cache=True):
+    """
+    | Loads a result from the result store of a CMF case.
+    | The results file is converted into a result store the first time it is loaded, or when it has changed since the
+    | store was written. The conversion reads all variables in a single pass over the file. After that only the
+    | requested cells and time steps are read from the memory mapped store.
+    | Loaded results are kept in the result cache, so fetching the same result again does not touch the disk.
+
+    :param file_path: Path to results.json
+    :param result_type: Name of the result to load or a list of names.
+    :param cells: Indices of the cells to load or a mask with a boolean for each cell. Default is all cells.
+    :param start: First time or time step index to load. Default is the first time step.
+    :param end: Last time or time step index to load, which is included. Default is the last time step.
+    :param stride: Load every stride'th time step. Default is 1.
+    :param use_cache: Whether to look up and keep the result in the result cache.
+    :return: List with the result of each cell, in the order of the cells. If a list of names is given, an ordered dict
+             with the result name as key and the list as value is returned. Results from the cache are shared, so the
+             returned lists and arrays should not be modified.
+    :rtype: list or collections.OrderedDict
+    """
+
+    if isinstance(result_type, (list, tuple)):
+        return collections.OrderedDict((type_, load_cmf_results(file_path, type_, cells, start, end, stride,
+                                                                use_cache))
+                                       for type_ in result_type)
+
+    if use_cache:
+        key = result_key(file_path, result_type, cells, start, end, stride)
+        result = result_cache.get(key)
+
+        if result is None:
+            result = load_cmf_results(file_path, result_type, cells, start, end, stride, use_cache=False)
+            result_cache.put(key, result)
+
+        return result
+
+    variables = result_variables([result_type, ])
+    store = open_result_store(file_path, variables)
+
+    try:
+        variable_results = dict((variable, store.read(variable, cells, start, end, stride))
+                                for variable in variables)
+
+        return combine_results(result_type, variable_results)
+
+    finally:
+        store.close()
+
+
+def aggregate_cmf_results(file_path, result_type, method, cells=None, start=None, end=None, stride=None,
+                          percentile=95, use_cache=True):
+    """
+    | Reduces a result to a single value per cell, or per cell and layer for layer results.
+    | The series are read from the result store and reduced one at a time, so only a single series is held in memory.
+
+    :param file_path: Path to results.json
+    :param result_type: Name of the result to aggregate.
+    :param method: Aggregation method: min, max, mean, sum, percentile or peak_time. peak_time gives the time step
+                   index of the maximum value.
+    :param cells: Indices of the cells to load or a mask with a boolean for each cell. Default is all cells.
+    :param start: First time or time step index to include. Default is the first time step.
+    :param end: Last time or time step index to include. Default is the last time step.
+    :param stride: Include every stride'th time step. Default is 1.
+    :param percentile: Percentile between 0 and 100 used by the percentile method.
+    :param use_cache: Whether to look up and keep the result in the result cache.
+    :return: List with a value for each cell. Layer results have a list with a value per layer for each cell.
+    :rtype: list
+    """
+
+    if use_cache:
+        key = result_key(file_path, (result_type, method, percentile), cells, start, end, stride)
+        result = result_cache.get(key)
+
+        if result is None:
+            result = aggregate_cmf_results(file_path, result_type, method, cells, start, end, stride, percentile,
+                                           use_cache=False)
+            result_cache.put(key, result)
+
+        return result
+
+    variables = result_variables([result_type, ])
+    store = open_result_store(file_path, variables)
+
+    try:
+        steps = store.time_slice(start, end, stride)
+        is_layer_result = store.variable_info(variables[0])['level'] == 'layer'
+        layers = range(store.layer_count(variables[0]))
+        aggregated = []
+
+        for cell in store.select_cells(cells):
+            cell_values = []
+
+            for layer in layers:
+                series = add_series([store.read_series(variable, cell, layer, steps)
+                                     for variable in variables])
+                value = aggregation.aggregate(series, method, percentile)
+
+                if method == 'peak_time' and value is not None:
+                    # Index in the full series instead of the slice
+                    value = steps.start + value * steps.step
+
+                cell_values.append(value)
+
+            if is_layer_result:
+                aggregated.append(cell_values)
+            else:
+                aggregated.append(cell_values[0])
+
+        return aggregated
+
+    finally:
+        store.close()
+
+
+def downsample_cmf_results(file_path, result_type, points, method='lttb', cells=None, start=None, end=None,
+                           stride=None, use_cache=True):
+    """
+    | Loads a result downsampled to a maximum number of points per series, for plotting.
+    | The series are read from the result store and downsampled one at a time, so the memory used only depends on the
+    | number of points and not on the length of the simulation.
+
+    :param file_path: Path to results.json
+    :param result_type: Name of the result to load.
+    :param points: Maximum number of points per series.
+    :param method: Downsampling method: lttb or min_max. See livestock.lib.downsampling.
+    :param cells: Indices of the cells to load or a mask with a boolean for each cell. Default is all cells.
+    :param start: First time or time step index to include. Default is the first time step.
+    :param end: Last time or time step index to include. Default is the last time step.
+    :param stride: Include every stride'th time step. Default is 1.
+    :param use_cache: Whether to look up and keep the result in the result cache.
+    :return: Values and time step indices of the kept points. Both are lists with an entry for each cell, structured
+             like the lists returned by load_cmf_results().
+    :rtype: tuple
+    """
+
+    if use_cache:
+        key = result_key(file_path, (result_type, 'downsample', method, points), cells, start, end, stride)
+        result = result_cache.get(key)
 
-    if result_type == 'evapotranspiration':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+        if result is None:
+            result = downsample_cmf_results(file_path, result_type, points, method, cells, start, end, stride,
+                                            use_cache=False)
+            result_cache.put(key, result)
 
-    elif result_type == 'surface_water_volume':
-        processed_result = []
+        return result
 
-        for index in range(len(result_data.keys())):
-            cell = 'cell_' + str(index)
-            processed_result.append(result_data[cell]['surface_water_volume'])
+    variables = result_variables([result_type, ])
+    store = open_result_store(file_path, variables)
 
-    elif result_type == 'surface_water_flux':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+    try:
+        steps = store.time_slice(start, end, stride)
+        is_layer_result = store.variable_info(variables[0])['level'] == 'layer'
+        layers = range(store.layer_count(variables[0]))
+        values = []
+        time_steps = []
 
-    elif result_type == 'heat_flux':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+        for cell in store.select_cells(cells):
+            cell_values = []
+            cell_time_steps = []
 
-    elif result_type == 'volumetric_flux':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+            for layer in layers:
+                series = add_series([store.read_series(variable, cell, layer, steps)
+                                     for variable in variables])
+                indices, kept = downsampling.downsample(series, points, method)
 
-    elif result_type == 'potential':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+                cell_values.append(kept)
+                # Index in the full series instead of the slice
+                cell_time_steps.append(array('i', [steps.start + index * steps.step
+                                                   for index in indices]))
 
-    elif result_type == 'theta':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+            if is_layer_result:
+                values.append(cell_values)
+                time_steps.append(cell_time_steps)
+            else:
+                values.append(cell_values[0])
+                time_steps.append(cell_time_steps[0])
 
-    elif result_type == 'volume':
-        processed_result = []
+        return values, time_steps
 
-        for cell in result_data.keys():
-            layer_result = []
-            for layer in result_data[cell]:
-                if layer.startswith('layer'):
-                    layer_result.append(result_data[cell][layer]['volume'])
+    finally:
+        store.close()
 
-            processed_result.append(layer_result)
 
-    elif result_type == 'wetness':
-        raise NotImplementedError('Load %i results is not '
-                                  'implemented yet' % result_type)
+def compare_cmf_results(base_path, variant_path, result_type, cells=None, start=None, end=None, stride=None):
+    """
+    | Compares a result of two CMF cases, e.g. two design variants simulated on the same mesh.
+    | The cases are aligned by cell, layer and time. If both cases have a time axis, the time steps are matched by
+    | time, otherwise by index. Only the time steps found in both cases are compared.
+    | The series are read from the result stores of the cases one pair at a time.
+
+    :param base_path: Path to results.json of the base case.
+    :param variant_path: Path to results.json of the variant case.
+    :param result_type: Name of the result to compare.
+    :param cells: Indices of the cells to compare or a mask with a boolean for each cell. Default is all cells.
+    :param start: First time or time step index of the base case to include. Default is the first time step.
+    :param end: Last time or time step index of the base case to include. Default is the last time step.
+    :param stride: Include every stride'th time step. Default is 1.
+    :return: Dict with the keys: difference (variant - base) and ratio (variant / base), which hold series structured
+             like the lists returned by load_cmf_results(), rmse, which holds the root mean square difference of each
+             series, and time_steps, which holds the compared time step indices of the base case.
+    :rtype: dict
+    """
+
+    variables = result_variables([result_type, ])
+    base = open_result_store(base_path, variables)
+
+    try:
+        variant = open_result_store(variant_path, variables)
+    except Exception:
+        base.close()
+        raise
+
+    try:
+        if base.cell_count != variant.cell_count:
+            raise ValueError('The cases do not have the same number of cells: %i and %i'
+                             % (base.cell_count, variant.cell_count))
+
+        layer_count = base.layer_count(variables[0])
+        if layer_count != variant.layer_count(variables[0]):
+            raise ValueError('The cases do not have the same number of layers: %i and %i'
+                             % (layer_count, variant.layer_count(variables[0])))
+
+        base_steps, variant_steps = align_time_steps(base, variant, start, end, stride)
+        is_layer_result = base.variable_info(variables[0])['level'] == 'layer'
+        comparison = {'difference': [],
+                      'ratio': [],
+                      'rmse': [],
+                      'time_steps': array('i', range(base_steps.start, base_steps.stop, base_steps.step))}
+
+        for cell in base.select_cells(cells):
+            cell_comparison = {'difference': [], 'ratio': [], 'rmse': []}
+
+            for layer in range(layer_count):
+                base_series = add_series([base.read_series(variable, cell, layer, base_steps)
+                                          for variable in variables])
+                variant_series = add_series([variant.read_series(variable, cell, layer, variant_steps)
+                                             for variable in variables])
+
+                difference, ratio, rmse = compare_series(base_series, variant_series)
+                cell_comparison['difference'].append(difference)
+                cell_comparison['ratio'].append(ratio)
+                cell_comparison['rmse'].append(rmse)
+
+            for key in cell_comparison:
+                if is_layer_result:
+                    comparison[key].append(cell_comparison[key])
+                else:
+                    comparison[key].append(cell_comparison[key][0])
+
+        return comparison
+
+    finally:
+        base.close()
+        variant.close()
+
+
+def align_time_steps(base, variant, start=None, end=None, stride=None):
+    """
+    Finds the time steps of two result stores, which are at the same time.
+
+    :param base: Result store of the base case.
+    :param variant: Result store of the variant case.
+    :param start: First time or time step index of the base case.
+    :param end: Last time or time step index of the base case.
+    :param stride: Take every stride'th time step.
+    :return: Slices of time steps in the base and the variant case with the same length.
+    :rtype: tuple
+    """
+
+    base_steps = base.time_slice(start, end, stride)
+
+    # Time step index in the base case of the first time step in the variant case
+    offset = 0
+    if base.time and variant.time:
+        if base.time['step'] != variant.time['step']:
+            raise ValueError('The cases do not have the same time step: %s s and %s s'
+                             % (base.time['step'], variant.time['step']))
+
+        seconds = result_store.total_seconds(result_store.to_datetime(variant.time['start']) -
+                                             result_store.to_datetime(base.time['start']))
+        offset = int(round(seconds / base.time['step']))
+
+    first = max(base_steps.start, offset)
+    if first > base_steps.start:
+        # Keep the stride aligned with the requested start
+        first = base_steps.start + -(-(first - base_steps.start) // base_steps.step) * base_steps.step
+    stop = max(first, min(base_steps.stop, variant.timestep_count + offset))
+
+    return slice(first, stop, base_steps.step), slice(first - offset, stop - offset, base_steps.step)
 
+
+def compare_series(base, variant):
+    """
+    Compares two series of the same length.
+
+    :param base: Float array of the base case.
+    :param variant: Float array of the variant case.
+    :return: Difference (variant - base), ratio (variant / base, NaN where base is 0) and root mean square difference.
+    :rtype: tuple
+    """
+
+    difference = array('d', map(operator.sub, variant, base))
+    ratio = array('d', [variant_value / base_value if base_value else float('nan')
+                        for base_value, variant_value in zip(base, variant)])
+
+    if difference:
+        rmse = math.sqrt(math.fsum(value * value for value in difference) / len(difference))
     else:
-        raise KeyError('Unknown result: %i to load.' % result_type)
+        rmse = None
+
+    return difference, ratio, rmse
+
+
+def open_result_store(file_path, variables):
+    """
+    Opens the result store of a results file. The store is created or updated first, if needed.
+
+    :param file_path: Path to results.json
+    :param variables: Variables that have to be in the store.
+    :return: Opened result store. It should be closed after use.
+    :rtype: livestock.lib.result_store.ResultStore
+    """
+
+    if not result_store.is_up_to_date(file_path):
+        result_store.convert_results(file_path)
+
+    store = result_store.ResultStore(result_store.store_folder(file_path))
+
+    missing = [variable
+               for variable in variables
+               if variable not in store.variables]
+    if missing:
+        store.close()
+        raise KeyError('Result: %s was not part of the outputs of the simulation.' % ', '.join(missing))
+
+    return store
+
+
+def result_key(file_path, result_type, cells=None, start=None, end=None, stride=None):
+    """
+    Creates the result cache key of a result.
+    The key contains the size and modification time of the results file, so cached results of a case that has been
+    simulated again are never returned.
+
+    :return: Cache key.
+    :rtype: tuple
+    """
+
+    stat = os.stat(file_path)
+
+    def time_key(time):
+        if time is None or isinstance(time, int):
+            return time
+        else:
+            return str(time)
+
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime, result_type,
+            None if cells is None else tuple(cells),
+            time_key(start), time_key(end), stride or 1)
+
+
+def result_size(result):
+    """
+    Estimates the memory used by a loaded result.
+
+    :param result: Float array, number or nested lists and tuples of those.
+    :return: Size in bytes.
+    :rtype: int
+    """
+
+    if isinstance(result, (list, tuple)):
+        return 64 + 8 * len(result) + sum(result_size(entry)
+                                          for entry in result)
+    elif isinstance(result, array):
+        return 64 + result.itemsize * len(result)
+    else:
+        return 24
+
+
+class ResultCache:
+    """
+    | Least recently used cache for loaded CMF results.
+    | The cache lives in the module, so it is shared by all components and kept between solutions. The least recently
+    | used results are dropped once the cached results take up more memory than the budget.
+    """
+
+    def __init__(self, budget):
+        """
+        :param budget: Memory budget in bytes.
+        """
+
+        self.budget = budget
+        self.entries = collections.OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        """
+        Looks up a result and marks it as recently used.
+
+        :param key: Cache key from result_key().
+        :return: Result or None if the result is not cached.
+        """
+
+        if key not in self.entries:
+            return None
+
+        result, size = self.entries.pop(key)
+        self.entries[key] = (result, size)
+
+        return result
+
+    def put(self, key, result):
+        """
+        Adds a result to the cache. Results bigger than the budget are not cached.
+
+        :param key: Cache key from result_key().
+        :param result: Result to cache.
+        """
+
+        self.remove(key)
+
+        size = result_size(result)
+        if size > self.budget:
+            return
+
+        self.entries[key] = (result, size)
+        self.size += size
+
+        self.trim()
+
+    def set_budget(self, budget):
+        """
+        Changes the memory budget and drops the least recently used results, which no longer fit.
+
+        :param budget: Memory budget in bytes.
+        """
+
+        self.budget = budget
+        self.trim()
+
+    def trim(self):
+        """Drops the least recently used results, until the cached results fit the budget."""
+
+        while self.size > self.budget:
+            _, (_, dropped_size) = self.entries.popitem(last=False)
+            self.size -= dropped_size
+
+    def remove(self, key):
+        """Removes a result from the cache, if it is cached."""
+
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+
+    def clear(self):
+        """Empties the cache."""
+
+        self.entries.clear()
+        self.size = 0
+
+
+result_cache_budget = 256 * 1024 ** 2
+result_cache = ResultCache(result_cache_budget)
+
+
+def set_result_cache_budget(budget):
+    """
+    Changes the memory budget of the shared result cache.
+    Assigning result_cache_budget after the module has been imported has no effect, so use this function instead.
+
+    :param budget: Memory budget in bytes.
+    """
+
+    global result_cache_budget
 
-    return processed_result
+    result_cache_budget = budget
+    result_cache.set_budget(budget)
@@ -0,0 +1,128 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Downsampling
+#
+# Reduces long time series to a fixed number of points for plotting, while keeping the visual shape of the series.
+# The series are assumed to be sampled at equal time steps, so the time step index is used as x value.
+# The functions return the indices of the kept points, so the time of each kept point is known.
+
+methods = ('lttb', 'min_max')
+
+
+def downsample(series, points, method='lttb'):
+    """
+    Downsamples a series to a number of points.
+
+    :param series: Sequence of floats.
+    :param points: Maximum number of points to keep. Series with fewer points are returned as they are.
+    :param method: lttb (Largest-Triangle-Three-Buckets) or min_max (minimum and maximum of each bucket).
+    :return: Indices of the kept points and their values.
+    :rtype: tuple
+    """
+
+    if method == 'lttb':
+        indices = lttb(series, points)
+    elif method == 'min_max':
+        indices = min_max(series, points)
+    else:
+        raise KeyError('Unknown downsampling method: ' + str(method) + '. Use one of: ' + ', '.join(methods))
+
+    return indices, array('d', [series[index] for index in indices])
+
+
+def lttb(series, points):
+    """
+    | Selects points with the Largest-Triangle-Three-Buckets algorithm.
+    | The first and last points are always kept. The points in between are split into points - 2 buckets. From each
+    | bucket, the point forming the largest triangle with the previously kept point and the average of the next
+    | bucket is kept.
+
+    :param series: Sequence of floats.
+    :param points: Number of points to keep. At least 3.
+    :return: Indices of the kept points.
+    :rtype: array
+    """
+
+    count = len(series)
+    if points >= count:
+        return array('i', range(count))
+    if points < 3:
+        raise ValueError('LTTB needs to keep at least 3 points. Got: ' + str(points))
+
+    bucket_size = (count - 2) / float(points - 2)
+    indices = array('i', [0])
+    previous = 0
+
+    for bucket in range(points - 2):
+        # Average point of the next bucket
+        next_start = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        average_x = (next_start + next_end - 1) / 2.0
+        average_y = sum(series[next_start:next_end]) / float(next_end - next_start)
+
+        # Point in the current bucket forming the largest triangle
+        previous_y = series[previous]
+        largest_area = -1.0
+        largest = next_start - 1
+
+        for index in range(int(bucket * bucket_size) + 1, next_start):
+            area = abs((previous - average_x) * (series[index] - previous_y) -
+                       (previous - index) * (average_y - previous_y))
+            if area > largest_area:
+                largest_area = area
+                largest = index
+
+        indices.append(largest)
+        previous = largest
+
+    indices.append(count - 1)
+
+    return indices
+
+
+def min_max(series, points):
+    """
+    Selects the minimum and maximum of equally sized buckets, which keeps the envelope of the series.
+
+    :param series: Sequence of floats.
+    :param points: Maximum number of points to keep. At least 2.
+    :return: Indices of the kept points in increasing order.
+    :rtype: array
+    """
+
+    count = len(series)
+    if points >= count:
+        return array('i', range(count))
+    if points < 2:
+        raise ValueError('Min-max downsampling needs to keep at least 2 points. Got: ' + str(points))
+
+    buckets = points // 2
+    bucket_size = count / float(buckets)
+    indices = array('i')
+
+    for bucket in range(buckets):
+        start = int(bucket * bucket_size)
+        end = min(int((bucket + 1) * bucket_size), count)
+
+        lowest = highest = start
+        for index in range(start + 1, end):
+            if series[index] < series[lowest]:
+                lowest = index
+            elif series[index] > series[highest]:
+                highest = index
+
+        indices.extend(sorted(set((lowest, highest))))
+
+    return indices
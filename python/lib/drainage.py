@@ -0,0 +1,144 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import math
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Drainage
+#
+# Drainage paths are traced over the face adjacency of a mesh (see livestock.lib.mesh_topology).
+# From a face, the water runs to the neighbouring face with the steepest descent between the face centroids.
+# A path ends in a face without any lower neighbours, which is where the water pools.
+# Paths are returned in CSR form: The faces of path i are path_faces[path_offsets[i]:path_offsets[i + 1]].
+
+
+def steepest_neighbour(face, centroids, offsets, neighbours):
+    """
+    Finds the neighbouring face with the steepest descent from a face.
+
+    :param face: Face index.
+    :param centroids: Flat face centroid array.
+    :param offsets: Offset array of the face adjacency.
+    :param neighbours: Neighbour array of the face adjacency.
+    :return: Index of the steepest neighbour or -1 if no neighbour is lower than the face.
+    :rtype: int
+    """
+
+    x = centroids[3 * face]
+    y = centroids[3 * face + 1]
+    z = centroids[3 * face + 2]
+
+    steepest = -1
+    steepest_slope = 0.0
+
+    for neighbour in neighbours[offsets[face]:offsets[face + 1]]:
+        drop = z - centroids[3 * neighbour + 2]
+        if drop <= 0:
+            continue
+
+        distance = math.hypot(centroids[3 * neighbour] - x, centroids[3 * neighbour + 1] - y)
+        if distance:
+            slope = drop / distance
+        else:
+            slope = float('inf')
+
+        if slope > steepest_slope:
+            steepest = neighbour
+            steepest_slope = slope
+
+    return steepest
+
+
+def trace_paths(centroids, offsets, neighbours, start_faces=None):
+    """
+    Traces the steepest descent paths from a set of faces.
+    Every step goes strictly downhill, so the paths always end.
+
+    :param centroids: Flat face centroid array.
+    :param offsets: Offset array of the face adjacency.
+    :param neighbours: Neighbour array of the face adjacency.
+    :param start_faces: Faces to start from. Default is all faces.
+    :return: Path offset array and path face array.
+    :rtype: tuple
+    """
+
+    if start_faces is None:
+        start_faces = range(len(offsets) - 1)
+
+    # The next face is the same for all paths passing through a face, so it is only computed once
+    next_faces = {}
+
+    path_offsets = array('i', [0])
+    path_faces = array('i')
+
+    for face in start_faces:
+        path_faces.append(face)
+
+        while True:
+            next_face = next_faces.get(face)
+            if next_face is None:
+                next_face = steepest_neighbour(face, centroids, offsets, neighbours)
+                next_faces[face] = next_face
+
+            if next_face < 0:
+                break
+
+            path_faces.append(next_face)
+            face = next_face
+
+        path_offsets.append(len(path_faces))
+
+    return path_offsets, path_faces
+
+
+def join_paths(path_chunks):
+    """
+    Joins paths traced in chunks into one set of paths.
+
+    :param path_chunks: List of (path offset array, path face array) tuples.
+    :return: Path offset array and path face array.
+    :rtype: tuple
+    """
+
+    path_offsets = array('i', [0])
+    path_faces = array('i')
+
+    for chunk_offsets, chunk_faces in path_chunks:
+        start = len(path_faces)
+        path_offsets.extend(start + offset
+                            for offset in chunk_offsets[1:])
+        path_faces.extend(chunk_faces)
+
+    return path_offsets, path_faces
+
+
+def split_range(count, chunks):
+    """
+    Splits range(count) into a number of contiguous chunks.
+
+    :param count: Number of elements.
+    :param chunks: Number of chunks.
+    :return: List of (start, stop) tuples.
+    :rtype: list
+    """
+
+    chunks = max(1, min(int(chunks), count))
+    size, remainder = divmod(count, chunks)
+
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        stop = start + size + (1 if i < remainder else 0)
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
@@ -0,0 +1,289 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import collections
+import os
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+import livestock.lib.result_store as result_store
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock EPW Reader
+#
+# Reads EnergyPlus weather files (.epw) without Ladybug Tools. The file is streamed line by line, only the requested
+# columns are parsed and the reading stops after the last hour of the requested period. Periods wrapping past the end
+# of the year, e.g. December to January, are supported.
+# The values are returned in the units the CMF Weather component takes as input, so cloud cover is converted from
+# tenths to a fraction. Missing values are replaced by the last valid value of the column.
+# Read weather is cached by the SHA-1 hash of the file, so recomputing a definition does not read the file again.
+
+header_lines = 8
+
+# Name: (column, missing value, scale)
+epw_columns = {'temp': (6, 99.9, 1.0),
+               'rel_hum': (8, 999.0, 1.0),
+               'global_radiation': (13, 9999.0, 1.0),
+               'wind': (21, 999.0, 1.0),
+               'cloud_cover': (22, 99.0, 0.1),
+               'rain': (33, 999.0, 1.0)}
+
+epw_variables = ('temp', 'wind', 'rel_hum', 'cloud_cover', 'global_radiation', 'rain', 'ground_temp')
+
+days_before_month = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+hours_per_year = 8760
+
+epw_cache_size = 8
+
+
+def hour_of_year(month, day, hour):
+    """
+    Returns the hour of the year of a date and time. Leap days are not counted, as in EPW files.
+
+    :param month: Month, 1 to 12.
+    :param day: Day of the month.
+    :param hour: Hour of the day, 0 to 23.
+    :return: Hour of the year, 0 to 8759.
+    :rtype: int
+    """
+
+    return (days_before_month[month - 1] + day - 1) * 24 + hour
+
+
+def to_hour_of_year(time):
+    """
+    Converts a time to an hour of the year.
+
+    :param time: Hour of the year as number, or a datetime, .NET DateTime or ISO formatted string. The year is ignored.
+    :return: Hour of the year. None if time is None.
+    :rtype: int
+    """
+
+    if time is None:
+        return None
+
+    if isinstance(time, (int, float)):
+        if not 0 <= time < hours_per_year:
+            raise ValueError('Hour of the year has to be between 0 and ' + str(hours_per_year - 1) + '. Got: ' +
+                             str(time))
+        return int(time)
+
+    time = result_store.to_datetime(time)
+
+    # EPW files have no leap day
+    day = time.day
+    if time.month == 2 and day == 29:
+        day = 28
+
+    return hour_of_year(time.month, day, time.hour)
+
+
+def read_location(line):
+    """
+    Reads the LOCATION header line of an EPW file.
+
+    :param line: LOCATION line.
+    :return: Dict with city, country, latitude, longitude, time_zone and elevation.
+    :rtype: dict
+    """
+
+    fields = line.strip().split(',')
+
+    return {'city': fields[1],
+            'country': fields[3],
+            'latitude': float(fields[6]),
+            'longitude': float(fields[7]),
+            'time_zone': float(fields[8]),
+            'elevation': float(fields[9])}
+
+
+def read_ground_temperatures(line):
+    """
+    Reads the monthly ground temperatures at the first depth from the GROUND TEMPERATURES header line.
+
+    :param line: GROUND TEMPERATURES line.
+    :return: Twelve monthly temperatures in C. None if the file has no ground temperatures.
+    :rtype: list
+    """
+
+    fields = line.strip().split(',')
+
+    try:
+        if int(fields[1]) < 1:
+            return None
+        return [float(value) for value in fields[6:18]]
+
+    except (IndexError, ValueError):
+        return None
+
+
+def read_epw(path, variables=epw_variables, start=None, end=None):
+    """
+    Reads weather from an EPW file.
+
+    :param path: Path to the EPW file.
+    :param variables: Variables to read. Any of: temp (C), wind (m/s), rel_hum (%), cloud_cover (0-1),
+                      global_radiation (W/m2), rain (mm/h) and ground_temp (C).
+    :param start: First hour to read. Hour of the year or a date and time. Default is the first hour of the file.
+    :param end: Last hour to read, inclusive. Hour of the year or a date and time. Default is the last hour of the file.
+                If end is before start, the period wraps past the end of the year, e.g. December to January.
+    :return: Dict with a float array for each variable, hour_of_year with the hour of the year of each value and
+             location with the location of the file. See read_location().
+    :rtype: dict
+    """
+
+    for variable in variables:
+        if variable not in epw_variables:
+            raise KeyError('Unknown EPW variable: ' + str(variable) + '. Use one of: ' + ', '.join(epw_variables))
+
+    start = to_hour_of_year(start)
+    end = to_hour_of_year(end)
+
+    # A period wrapping past the end of the year is read as the end of the file followed by the start of the file
+    wraps = start is not None and end is not None and start > end
+    wrapped_count = 0
+
+    columns = [(variable, ) + epw_columns[variable]
+               for variable in variables
+               if variable in epw_columns]
+    last_valid = dict((variable, 0.0) for variable in variables)
+    weather = dict((variable, array('d')) for variable in variables)
+    hours = array('i')
+    location = None
+    ground_temperatures = None
+
+    with open(path, 'r') as file_obj:
+        for line_number, line in enumerate(file_obj):
+            if line_number < header_lines:
+                if line.startswith('LOCATION'):
+                    location = read_location(line)
+                elif line.startswith('GROUND TEMPERATURES'):
+                    ground_temperatures = read_ground_temperatures(line)
+                continue
+
+            fields = line.split(',')
+            if len(fields) < 6:
+                continue
+
+            month = int(fields[1])
+            hour = hour_of_year(month, int(fields[2]), int(fields[3]) - 1)
+
+            if wraps:
+                if end < hour < start:
+                    continue
+                if hour <= end:
+                    wrapped_count += 1
+
+            else:
+                if start is not None and hour < start:
+                    continue
+                if end is not None and hour > end:
+                    break
+
+            hours.append(hour)
+
+            for variable, column, missing, scale in columns:
+                try:
+                    value = float(fields[column])
+                except (IndexError, ValueError):
+                    value = missing
+
+                if value >= missing:
+                    value = last_valid[variable]
+                else:
+                    value *= scale
+                    last_valid[variable] = value
+
+                weather[variable].append(value)
+
+            if 'ground_temp' in weather:
+                weather['ground_temp'].append(ground_temperatures[month - 1] if ground_temperatures else 0.0)
+
+    if wrapped_count:
+        for variable in variables:
+            weather[variable] = weather[variable][wrapped_count:] + weather[variable][:wrapped_count]
+        hours = hours[wrapped_count:] + hours[:wrapped_count]
+
+    weather['hour_of_year'] = hours
+    weather['location'] = location
+
+    return weather
+
+
+class EPWCache:
+    """
+    | Cache of read EPW files, keyed by the SHA-1 hash of the file.
+    | The hash of a file is only computed again, if its size or modification time has changed.
+    """
+
+    def __init__(self, size):
+        """
+        :param size: Number of readings to keep.
+        """
+
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hashes = {}
+
+    def file_hash(self, path):
+        """Returns the hash of a file, reusing the last hash if the file has not been modified."""
+
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+
+        if path not in self.hashes or self.hashes[path][0] != signature:
+            self.hashes[path] = (signature, mesh_io.file_hash(path))
+
+        return self.hashes[path][1]
+
+    def read(self, path, variables=epw_variables, start=None, end=None):
+        """Reads weather from an EPW file or from the cache. See read_epw()."""
+
+        key = (self.file_hash(path), tuple(variables), to_hour_of_year(start), to_hour_of_year(end))
+
+        if key in self.entries:
+            weather = self.entries.pop(key)
+
+        else:
+            weather = read_epw(path, variables, start, end)
+
+        self.entries[key] = weather
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+        return weather
+
+    def clear(self):
+        """Empties the cache."""
+
+        self.entries.clear()
+        self.hashes.clear()
+
+
+epw_cache = EPWCache(epw_cache_size)
+
+
+def load_epw(path, variables=epw_variables, start=None, end=None, use_cache=True):
+    """
+    Loads weather from an EPW file. See read_epw().
+
+    :param path: Path to the EPW file.
+    :param variables: Variables to read.
+    :param start: First hour to read.
+    :param end: Last hour to read, inclusive.
+    :param use_cache: Whether to use the cache of read EPW files or not.
+    :return: Dict with a float array for each variable.
+    :rtype: dict
+    """
+
+    if not use_cache:
+        return read_epw(path, variables, start, end)
+
+    return epw_cache.read(path, variables, start, end)
@@ -7,14 +7,23 @@ __license__ = "GNU GPLv3"
 # Module imports
 import os
 import json
+from array import array
 
 # Livestock imports
+import livestock.lib.drainage as drainage
+import livestock.lib.mesh_io as mesh_io
+import livestock.lib.mesh_metrics as mesh_metrics
+import livestock.lib.mesh_topology as mesh_topology
+from livestock.lib.raytrace import RayTracer
+from livestock.lib.spatial_index import PointIndex
 
 # Grasshopper imports
+from System import Array
 import Rhino.Geometry as rg
 import scriptcontext as sc
 import rhinoscriptsyntax as rs
 import Rhino as rc
+from System.Threading.Tasks import Parallel, ParallelOptions
 from System.Threading.Tasks.Parallel import ForEach
 from Rhino.Geometry.Brep import JoinBreps
 
@@ -22,22 +31,40 @@ from Rhino.Geometry.Brep import JoinBreps
 # Livestock Grasshopper Geometry Classes and Functions
 
 
-def obj_export(mesh, file_path):
+def obj_export(mesh, file_path, precision=None, compress=False):
+    """
+    Exports a mesh to an .obj file.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :param file_path: Path including file name. The .obj extension is added if missing.
+    :param precision: Number of decimals to write the vertex coordinates with. Default is full precision.
+    :param compress: Whether to gzip the file or not.
+    :return: Path of the written file.
+    """
+
+    vertices, faces = mesh_to_arrays(mesh)
+
+    return mesh_io.write_obj(file_path, vertices, faces, precision, compress)
+
+
+def mesh_to_arrays(mesh):
+    """
+    Converts a Rhino mesh into flat vertex and face arrays.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :return: Flat vertex array and flat face array with four indices per face.
+    """
+
+    mesh = rs.coercemesh(mesh)
 
-    if not file_path.endswith('.obj'):
-        file_path = file_path + '.obj'
+    # ToFloatArray() returns single precision coordinates, so the vertices are read as double precision points
+    vertices = array('d')
+    for point in mesh.Vertices.ToPoint3dArray():
+        vertices.extend((point.X, point.Y, point.Z))
 
-    with open(file_path, 'w') as file_obj:
-        file_obj.write('# Livestock OBJ exporter\n')
-        for vert in rs.MeshVertices(mesh):
-            file_obj.write('v ' + str(vert.X) + ' ' + str(vert.Y) + ' ' + str(vert.Z) + '\n')
-        for fvert in rs.MeshFaceVertices(mesh):
-            if len(fvert) == 3:
-                file_obj.write('f ' + str(fvert[0] + 1) + ' ' + str(fvert[1] + 1) + ' ' + str(fvert[2] + 1) + '\n')
-            elif len(fvert) == 4:
-                file_obj.write(
-                    'f ' + str(fvert[0] + 1) + ' ' + str(fvert[1] + 1) + ' ' + str(fvert[2] + 1) + ' ' +
-                    str(fvert[3] + 1) + '\n')
+    faces = array('i', mesh.Faces.ToIntArray(False))
+
+    return vertices, faces
 
 
 def bake(geo, doc):
@@ -120,41 +147,188 @@ def bake_export_delete(geo, file_path, file_name, file_type, doc):
     export([g, ], file_path, file_name, file_type, doc)
 
 
-def import_obj(path):
+def mesh_face_metrics(mesh):
+    """
+    Computes the area, centroid, normal, slope and aspect of all faces of a mesh.
+    See livestock.lib.mesh_metrics.face_metrics() for details.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :return: Dict with the arrays: area, centroid, normal, slope and aspect.
+    """
+
+    vertices, faces = mesh_to_arrays(mesh)
+
+    return mesh_metrics.face_metrics(vertices, faces)
+
+
+def mesh_face_adjacency(mesh):
+    """
+    Builds the face adjacency of a mesh.
+    See livestock.lib.mesh_topology.face_adjacency() for details.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :return: Offset array and neighbour array in CSR form.
+    """
+
+    vertices, faces = mesh_to_arrays(mesh)
+
+    return mesh_topology.face_adjacency(faces)
+
+
+def mesh_cell_index(mesh):
+    """
+    Builds a spatial index over the face centroids of a mesh.
+    See livestock.lib.spatial_index.PointIndex for the available queries.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :return: Spatial index where the point indices are the face indices.
+    """
+
+    return PointIndex(mesh_face_metrics(mesh)['centroid'])
+
+
+def closest_cell(mesh, location):
+    """
+    Finds the mesh face with the centroid closest to a location.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :param location: Rhino point or a list with the x, y and z coordinates.
+    :return: Face index.
+    """
+
+    x, y, z = location_to_coordinates(location)
+
+    return mesh_cell_index(mesh).nearest(x, y, z)[0]
+
+
+def location_to_coordinates(location):
+    """
+    Converts a location into a tuple of floats.
+
+    :param location: Rhino point, a list with the coordinates or a comma separated string.
+    :return: x, y and z coordinate.
+    """
+
+    if isinstance(location, str):
+        location = location.split(',')
+
+    elif hasattr(location, 'X'):
+        location = [location.X, location.Y, location.Z]
+
+    return float(location[0]), float(location[1]), float(location[2])
+
+
+def mesh_drain_paths(mesh, cpus=1):
+    """
+    Traces the steepest descent drainage path from the centroid of every face of a mesh.
+    The faces are split into chunks, which are traced in parallel on the given number of cpus.
+    See livestock.lib.drainage for details.
+
+    :param mesh: Rhino mesh or the ID of one.
+    :param cpus: Number of cpus to trace the paths on.
+    :return: Path offset array, path face array and face centroid array.
+    """
+
+    vertices, faces = mesh_to_arrays(mesh)
+    centroids = mesh_metrics.face_metrics(vertices, faces)['centroid']
+    offsets, neighbours = mesh_topology.face_adjacency(faces)
+
+    cpus = max(1, int(cpus))
+    chunks = drainage.split_range(len(faces) // 4, 4 * cpus)
+    traced = [None] * len(chunks)
+
+    def trace_chunk(i):
+        start, stop = chunks[i]
+        traced[i] = drainage.trace_paths(centroids, offsets, neighbours, range(start, stop))
+
+    if cpus > 1:
+        options = ParallelOptions()
+        options.MaxDegreeOfParallelism = cpus
+        Parallel.For(0, len(chunks), options, trace_chunk)
+    else:
+        for i in range(len(chunks)):
+            trace_chunk(i)
+
+    path_offsets, path_faces = drainage.join_paths(traced)
+
+    return path_offsets, path_faces, centroids
+
+
+def paths_to_points(path_offsets, path_faces, centroids):
+    """
+    Converts drainage paths into lists of Rhino points through the face centroids.
+
+    :param path_offsets: Path offset array.
+    :param path_faces: Path face array.
+    :param centroids: Flat face centroid array.
+    :return: List with a list of points for each path.
+    """
+
+    points = []
+    for i in range(len(path_offsets) - 1):
+        points.append([rg.Point3d(centroids[3 * face], centroids[3 * face + 1], centroids[3 * face + 2])
+                       for face in path_faces[path_offsets[i]:path_offsets[i + 1]]])
+
+    return points
+
+
+def export_mesh(geo, file_path, file_name, doc):
+    """
+    Exports Grasshopper mesh geometry to an .obj file.
+    The mesh is written directly from its vertex and face arrays. Only if the geometry can not be coerced into a mesh,
+    it falls back to baking and exporting it through the Rhino command line with bake_export_delete().
+
+    :param geo: Grasshopper geometry.
+    :param file_path: File directory
+    :param file_name: File name without extension.
+    :param doc: Grasshopper document
+    :return: Path of the written file.
+    """
+
+    mesh = rs.coercemesh(geo)
+
+    if mesh:
+        return obj_export(mesh, os.path.join(file_path, file_name))
+
+    else:
+        bake_export_delete(geo, file_path, file_name, '.obj', doc)
+        return os.path.join(file_path, file_name + '.obj')
+
+
+def import_obj(path, use_cache=True):
     """
     Reads a .obj file and converts it into a Rhino Mesh.
+    Unless use_cache is False, a binary sidecar is written next to the .obj file on the first load and read instead of
+    the .obj file on the following loads.
 
     :param path: path including file name and file extension (.obj)
+    :param use_cache: Whether to use the binary mesh cache or not.
     :return: Rhino Mesh
     """
 
-    # Initialize mesh
-    mesh = rg.Mesh()
+    vertices, faces = mesh_io.load_obj(path, use_cache)
 
-    # Open File
-    file_ = open(path)
-    lines = file_.readlines()
-    file_.close()
-
-    for line in lines:
-        if line.find("v") == 0 and line.find("n") == -1 and line.find(
-                "t") == -1:
-            mesh.Vertices.Add(rg.Point3d(float((line.split(' '))[1]),
-                                         float((line.split(' '))[2]),
-                                         float((line.split(' '))[3])))
-        if line.find("f") == 0:
-            if len(line.split(' ')) == 4:
-                mesh.Faces.AddFace(
-                    rg.MeshFace(int(line.split(' ')[1].split('/')[0]) - 1,
-                                int(line.split(' ')[2].split('/')[0]) - 1,
-                                int(line.split(' ')[3].split('/')[0]) - 1))
-
-            elif len(line.split(' ')) == 5:
-                mesh.Faces.AddFace(
-                    rg.MeshFace(int(line.split(' ')[1].split('/')[0]) - 1,
-                                int(line.split(' ')[2].split('/')[0]) - 1,
-                                int(line.split(' ')[3].split('/')[0]) - 1,
-                                int(line.split(' ')[4].split('/')[0]) - 1))
+    return mesh_from_arrays(vertices, faces)
+
+
+def mesh_from_arrays(vertices, faces):
+    """
+    Creates a Rhino Mesh from flat vertex and face arrays.
+    The vertices and faces are added to the mesh in one call each.
+
+    :param vertices: Flat list of vertex coordinates: x, y, z, x, y, z, ...
+    :param faces: Flat list of face vertex indices with four indices per face.
+    :return: Rhino Mesh
+    """
+
+    points = [rg.Point3d(vertices[i], vertices[i + 1], vertices[i + 2])
+              for i in range(0, len(vertices), 3)]
+    mesh_faces = [rg.MeshFace(faces[i], faces[i + 1], faces[i + 2], faces[i + 3])
+                  for i in range(0, len(faces), 4)]
+
+    mesh = rg.Mesh()
+    mesh.Vertices.AddVertices(Array[rg.Point3d](points))
+    mesh.Faces.AddFaces(Array[rg.MeshFace](mesh_faces))
 
     mesh.Normals.ComputeNormals()
     mesh.Compact()
@@ -297,64 +471,53 @@ def join_mesh(mesh_list):
 def rayTrace(startPts, startVectors, context, numOfBounce, lastBounceLen):
     #"""Ladybug - RayTrace"""
 
-    # A failed attampt to use mesh instead of brep so the component could work with trimmed surfaces
-    if len(context) != 0:
-        ## clean the geometry and bring them to rhinoCommon separated as mesh and Brep
-        contextMesh, contextBrep = clean_and_coerce_list(context)
-        ## mesh Brep
-        contextMeshedBrep = parallel_make_context_mesh(contextBrep)
-
-        ## Flatten the list of surfaces
-        contextMeshedBrep = flatten_list(contextMeshedBrep)
-        contextSrfs = contextMesh + contextMeshedBrep
-        joinedContext = join_mesh(contextSrfs)
-
-    # Get rid of trimmed parts
-    cleanBrep = rg.Brep.CreateFromMesh(joinedContext, False)
-
-    rays = []
-    for testPt in startPts:
-        for vector in startVectors:
-            vector.Unitize()
-            ray = rg.Ray3d(testPt, vector)
-            if numOfBounce > 0:
-                intPts = rc.Intersect.Intersection.RayShoot(ray, [cleanBrep], numOfBounce)
-                # print intPts
-                if intPts:
-                    ptList = [testPt]
-                    ptList.extend(intPts)
-                    ray = rc.Polyline(ptList).ToNurbsCurve()
-
-                    try:
-                        # create last ray
-                        # calculate plane at intersection
-                        intNormal = cleanBrep.ClosestPoint(intPts[-1], sc.doc.ModelAbsoluteTolerance)[5]
-
-                        lastVector = rc.Vector3d(ptList[-2] - ptList[-1])
-                        lastVector.Unitize()
+    if len(context) == 0 or numOfBounce <= 0:
+        print("No reflection!")
+        return False
 
-                        crossProductNormal = rc.Vector3d.CrossProduct(intNormal, lastVector)
+    ## clean the geometry and bring them to rhinoCommon separated as mesh and Brep
+    contextMesh, contextBrep = clean_and_coerce_list(context)
 
-                        plane = rc.Plane(intPts[-1], intNormal, crossProductNormal)
+    ## mesh Brep
+    contextMeshedBrep = parallel_make_context_mesh(contextBrep)
 
-                        mirrorT = rc.Transform.Mirror(intPts[-1], plane.Normal)
+    ## Flatten the list of surfaces
+    contextMeshedBrep = [m
+                         for meshes in contextMeshedBrep if meshes
+                         for m in meshes]
+    joinedContext = join_mesh(contextMesh + contextMeshedBrep)
 
-                        lastRay = rc.Line(intPts[-1], lastBounceLen * lastVector).ToNurbsCurve()
-                        lastRay.Transform(mirrorT)
+    ## Trace all rays at once against the BVH of the joined context
+    vertices, faces = mesh_to_arrays(joinedContext)
+    tracer = RayTracer(vertices, faces)
 
-                        ray = rc.Curve.JoinCurves([ray, lastRay])[0]
-                    except:
-                        pass
+    origins = []
+    directions = []
+    for testPt in startPts:
+        for vector in startVectors:
+            origins.extend((testPt.X, testPt.Y, testPt.Z))
+            directions.extend((vector.X, vector.Y, vector.Z))
 
-                    rays.append(ray)
-                else:
-                    # no bounce so let's just create a line form the point
-                    firstRay = rc.Line(testPt, lastBounceLen * vector).ToNurbsCurve()
-                    rays.append(firstRay)
+    # The tracer reflects each ray numOfBounce - 1 times, which gives numOfBounce hits per ray
+    traced = tracer.trace(origins, directions, numOfBounce - 1)
 
-    if len(rays) == 0:
-        print("No reflection!")
-        return False
+    rays = []
+    for ray in range(len(origins) // 3):
+        ptList = [rg.Point3d(origins[3 * ray], origins[3 * ray + 1], origins[3 * ray + 2])]
+        lastVector = rg.Vector3d(directions[3 * ray], directions[3 * ray + 1], directions[3 * ray + 2])
+        lastVector.Unitize()
+
+        for bounce in range(numOfBounce):
+            entry = ray * numOfBounce + bounce
+            if traced['faces'][entry] < 0:
+                break
+
+            ptList.append(rg.Point3d(*traced['points'][3 * entry:3 * entry + 3]))
+            lastVector = rg.Vector3d(*traced['directions'][3 * entry:3 * entry + 3])
+
+        # create last ray
+        ptList.append(ptList[-1] + lastBounceLen * lastVector)
+        rays.append(rg.Polyline(ptList).ToNurbsCurve())
 
     return rays
 
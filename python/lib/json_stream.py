@@ -0,0 +1,288 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import json
+import re
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock JSON Stream
+#
+# An incremental pull reader for large JSON files. The file is read in chunks and walked once. The caller decides for
+# every value whether to read or skip it, so only the requested values are ever materialised.
+
+whitespace = re.compile(r'\s*')
+scalar = re.compile(r'-?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+)|true|false|null|NaN|-?Infinity')
+structure = re.compile(r'["\[\]{}]')
+string_end = re.compile(r'["\\]')
+
+
+class JsonStream:
+    """
+    | Pull reader for a JSON file object.
+    | Objects are walked with iter_object(), which yields the keys one at a time. The value of each key has to be
+    | consumed with one of the read or skip methods before the next key is requested.
+    """
+
+    def __init__(self, file_obj, chunk_size=2 ** 20):
+        """
+        :param file_obj: File object opened in text mode.
+        :param chunk_size: Number of characters to read at a time.
+        """
+
+        self.file_obj = file_obj
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Reads the next chunk into the buffer and discards what has been consumed.
+
+        :return: False if the end of the file has been reached.
+        :rtype: bool
+        """
+
+        if self.eof:
+            return False
+
+        chunk = self.file_obj.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character without consuming it. Empty string at end of file."""
+
+        while True:
+            self.position = whitespace.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, character):
+        """Consumes the next character, which has to be the given one."""
+
+        found = self.peek()
+        if found != character:
+            raise ValueError('Expected ' + repr(character) + ' but found ' + repr(found) +
+                             ' in JSON stream')
+        self.position += 1
+
+    def find(self, pattern):
+        """
+        Searches for a pattern from the current position, reading more chunks if needed.
+
+        :param pattern: Compiled regular expression.
+        :return: Match object.
+        """
+
+        while True:
+            match = pattern.search(self.buffer, self.position)
+            if match:
+                return match
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON stream')
+
+    def read_string(self):
+        """Reads a string."""
+
+        self.expect('"')
+        start = self.position
+        scan = start
+
+        while True:
+            match = string_end.search(self.buffer, scan)
+
+            if not match or (match.group() == '\\' and match.end() >= len(self.buffer)):
+                # Keep the string read so far and read the next chunk
+                scan -= start
+                self.position = start
+                if not self.fill():
+                    raise ValueError('Unexpected end of JSON stream')
+                start = self.position
+                scan += start
+
+            elif match.group() == '\\':
+                # Skip the escaped character
+                scan = match.end() + 1
+
+            else:
+                text = self.buffer[start:match.start()]
+                self.position = match.end()
+                break
+
+        if '\\' in text:
+            return json.loads('"' + text + '"')
+        else:
+            return text
+
+    def read_scalar(self):
+        """Reads a number, true, false or null."""
+
+        self.peek()
+
+        # Make sure the whole scalar is in the buffer
+        while not self.eof and len(self.buffer) - self.position < 64:
+            self.fill()
+
+        match = scalar.match(self.buffer, self.position)
+        if not match:
+            raise ValueError('Could not read value at: ' + repr(self.buffer[self.position:self.position + 20]))
+        self.position = match.end()
+
+        return json.loads(match.group())
+
+    def read_number_array(self, type_code='d'):
+        """
+        Reads a flat array of numbers into a typed array.
+        The numbers are parsed in one go, instead of one token at a time.
+
+        :param type_code: Type code of the returned array.
+        :return: Typed array.
+        :rtype: array
+        """
+
+        self.expect('[')
+        start = self.position
+        scan = start
+
+        while True:
+            end = self.buffer.find(']', scan)
+            if end >= 0:
+                break
+
+            # Keep the array read so far and read the next chunk
+            scan = len(self.buffer) - start
+            self.position = start
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON stream')
+            start = self.position
+            scan += start
+
+        text = self.buffer[start:end]
+        self.position = end + 1
+
+        if '[' in text or '{' in text or '"' in text:
+            raise ValueError('Expected a flat array of numbers in JSON stream')
+
+        text = text.strip()
+        if not text:
+            return array(type_code)
+
+        return array(type_code, [float(value)
+                                 for value in text.split(',')])
+
+    def skip_value(self):
+        """Skips the next value without materialising it."""
+
+        character = self.peek()
+
+        if character == '"':
+            self.read_string()
+
+        elif character in '[{':
+            depth = 0
+            while True:
+                match = self.find(structure)
+                token = match.group()
+                self.position = match.end()
+
+                if token == '"':
+                    self.position -= 1
+                    self.read_string()
+                elif token in '[{':
+                    depth += 1
+                else:
+                    depth -= 1
+                    if not depth:
+                        return
+
+        else:
+            self.read_scalar()
+
+    def read_value(self):
+        """Reads the next value of any type into Python objects."""
+
+        character = self.peek()
+
+        if character == '{':
+            value = {}
+            for key in self.iter_object():
+                value[key] = self.read_value()
+            return value
+
+        elif character == '[':
+            value = []
+            for _ in self.iter_array():
+                value.append(self.read_value())
+            return value
+
+        elif character == '"':
+            return self.read_string()
+
+        else:
+            return self.read_scalar()
+
+    def iter_object(self):
+        """
+        Walks an object and yields its keys.
+        The value belonging to each key has to be consumed before the next key is requested.
+        """
+
+        self.expect('{')
+
+        if self.peek() == '}':
+            self.position += 1
+            return
+
+        while True:
+            key = self.read_string()
+            self.expect(':')
+            yield key
+
+            character = self.peek()
+            self.position += 1
+            if character == '}':
+                return
+            elif character != ',':
+                raise ValueError('Expected , or } but found ' + repr(character) + ' in JSON stream')
+
+    def iter_array(self):
+        """
+        Walks an array and yields the index of each element.
+        Each element has to be consumed before the next index is requested.
+        """
+
+        self.expect('[')
+
+        if self.peek() == ']':
+            self.position += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+
+            character = self.peek()
+            self.position += 1
+            if character == ']':
+                return
+            elif character != ',':
+                raise ValueError('Expected , or ] but found ' + repr(character) + ' in JSON stream')
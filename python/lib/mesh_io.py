@@ -0,0 +1,375 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import gzip
+import hashlib
+import io
+import os
+import struct
+import sys
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Mesh IO Functions
+#
+# The functions in this module work on flat, typed arrays and do not depend on Rhino, so they can be used and
+# benchmarked outside of Grasshopper.
+# Vertices are stored as x, y, z triples in an array('d').
+# Faces are stored as four vertex indices per face in an array('i'). Triangles repeat their last index, which is the
+# same convention as Rhino.Geometry.MeshFace uses.
+
+cache_extension = '.lsmesh'
+cache_magic = b'LSMESH'
+cache_version = 1
+
+# Magic, version, .obj size, .obj mtime, .obj sha1, vertex count, face count
+cache_header = struct.Struct('<6sHqd20sqq')
+
+
+def read_obj(path):
+    """
+    Reads the vertices and faces of an .obj file in a single pass.
+    Each line is only tokenized once, so tabs, multiple spaces and v/vt/vn face indices are all handled.
+    Faces with more than four vertices are fan triangulated.
+    Gzip compressed files (.obj.gz) are decompressed while reading.
+
+    :param path: Path including file name and file extension (.obj)
+    :type path: str
+    :return: Flat vertex array and flat face array.
+    :rtype: tuple
+    """
+
+    vertices = array('d')
+    faces = array('i')
+    add_vertex = vertices.extend
+    add_face = faces.extend
+
+    with open_text(path) as file_obj:
+        for line in file_obj:
+            tokens = line.split()
+
+            if not tokens:
+                continue
+
+            key = tokens[0]
+
+            if key == 'v':
+                add_vertex((float(tokens[1]), float(tokens[2]), float(tokens[3])))
+
+            elif key == 'f':
+                vertex_count = len(vertices) // 3
+                indices = [face_index(token, vertex_count)
+                           for token in tokens[1:]]
+                corners = len(indices)
+
+                if corners == 3:
+                    add_face((indices[0], indices[1], indices[2], indices[2]))
+
+                elif corners == 4:
+                    add_face(indices)
+
+                elif corners > 4:
+                    for i in range(1, corners - 1):
+                        add_face((indices[0], indices[i], indices[i + 1], indices[i + 1]))
+
+    return vertices, faces
+
+
+def face_index(token, vertex_count):
+    """
+    Converts a .obj face token (v, v/vt, v//vn or v/vt/vn) into a zero-based vertex index.
+
+    :param token: Face token.
+    :type token: str
+    :param vertex_count: Number of vertices read so far. Used to resolve negative (relative) indices.
+    :type vertex_count: int
+    :return: Zero-based vertex index.
+    :rtype: int
+    """
+
+    index = int(token.split('/', 1)[0])
+
+    if index < 0:
+        return vertex_count + index
+    else:
+        return index - 1
+
+
+def write_obj(path, vertices, faces, precision=None, compress=False, chunk_size=2 ** 16):
+    """
+    Writes vertices and faces to an .obj file.
+    The lines are formatted and joined in chunks, so each chunk is written with a single write() call.
+
+    :param path: Path including file name. The .obj extension (.obj.gz if compressed) is added if missing.
+    :type path: str
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array with four indices per face. Triangles repeat their last index.
+    :param precision: Number of decimals to write the vertex coordinates with. Default is full precision.
+    :type precision: int
+    :param compress: Whether to gzip the file or not.
+    :type compress: bool
+    :param chunk_size: Number of lines to format before writing them.
+    :type chunk_size: int
+    :return: Path of the written file.
+    :rtype: str
+    """
+
+    extension = '.obj.gz' if compress else '.obj'
+    if not path.endswith(extension):
+        path = path + extension
+
+    if precision is None:
+        vertex_format = 'v %r %r %r'
+    else:
+        vertex_format = 'v %.{0}f %.{0}f %.{0}f'.format(int(precision))
+
+    if compress:
+        file_obj = gzip.open(path, 'wb')
+    else:
+        file_obj = open(path, 'wb')
+
+    with file_obj:
+        file_obj.write(b'# Livestock OBJ exporter\n')
+
+        vertex_step = 3 * chunk_size
+        for start in range(0, len(vertices), vertex_step):
+            lines = [vertex_format % (vertices[i], vertices[i + 1], vertices[i + 2])
+                     for i in range(start, min(start + vertex_step, len(vertices)), 3)]
+            file_obj.write(('\n'.join(lines) + '\n').encode('ascii'))
+
+        face_step = 4 * chunk_size
+        for start in range(0, len(faces), face_step):
+            lines = [format_face(faces[i], faces[i + 1], faces[i + 2], faces[i + 3])
+                     for i in range(start, min(start + face_step, len(faces)), 4)]
+            file_obj.write(('\n'.join(lines) + '\n').encode('ascii'))
+
+    return path
+
+
+def format_face(a, b, c, d):
+    """Formats a face as an one-based .obj face line."""
+
+    if c == d:
+        return 'f %d %d %d' % (a + 1, b + 1, c + 1)
+    else:
+        return 'f %d %d %d %d' % (a + 1, b + 1, c + 1, d + 1)
+
+
+def open_text(path):
+    """Opens a text file for reading. Gzip compressed files (.gz) are decompressed on the fly."""
+
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(io.BufferedReader(gzip.open(path, 'rb')))
+    else:
+        return open(path, 'r')
+
+
+def load_obj(path, use_cache=True):
+    """
+    Loads the vertices and faces of an .obj file.
+    If use_cache is True a binary sidecar file (<name>.lsmesh) is read instead of the .obj file, when it is up to date.
+    Otherwise the .obj file is parsed and the sidecar is written for the next load.
+
+    :param path: Path including file name and file extension (.obj)
+    :type path: str
+    :param use_cache: Whether to use the binary sidecar or not.
+    :type use_cache: bool
+    :return: Flat vertex array and flat face array.
+    :rtype: tuple
+    """
+
+    if not use_cache:
+        return read_obj(path)
+
+    cached = read_mesh_cache(path)
+    if cached:
+        return cached
+
+    vertices, faces = read_obj(path)
+    write_mesh_cache(path, vertices, faces)
+
+    return vertices, faces
+
+
+def cache_path(path):
+    """Returns the path of the binary sidecar belonging to an .obj file."""
+
+    return os.path.splitext(path)[0] + cache_extension
+
+
+def file_hash(path, block_size=2 ** 20):
+    """
+    Computes the SHA-1 digest of a file, reading it in blocks.
+
+    :param path: File path.
+    :param block_size: Number of bytes to read at a time.
+    :return: Binary digest.
+    :rtype: bytes
+    """
+
+    digest = hashlib.sha1()
+
+    with open(path, 'rb') as file_obj:
+        block = file_obj.read(block_size)
+        while block:
+            digest.update(block)
+            block = file_obj.read(block_size)
+
+    return digest.digest()
+
+
+def write_mesh_cache(path, vertices, faces, digest=None):
+    """
+    Writes the binary sidecar for an .obj file.
+    The sidecar holds a header with the size, modification time and hash of the .obj file followed by the packed
+    vertex and face arrays.
+    The sidecar is first written to a temporary file and then moved into place.
+
+    :param path: Path of the .obj file.
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array.
+    :param digest: SHA-1 digest of the .obj file. Computed if not given.
+    :return: Path of the sidecar or None if it could not be written.
+    """
+
+    sidecar = cache_path(path)
+    tmp_sidecar = sidecar + '.tmp'
+
+    try:
+        stat = os.stat(path)
+        if digest is None:
+            digest = file_hash(path)
+
+        header = cache_header.pack(cache_magic, cache_version, stat.st_size, stat.st_mtime, digest,
+                                   len(vertices) // 3, len(faces) // 4)
+
+        with open(tmp_sidecar, 'wb') as file_obj:
+            file_obj.write(header)
+            file_obj.write(array_to_bytes(to_little_endian(array('d', vertices))))
+            file_obj.write(array_to_bytes(to_little_endian(array('i', faces))))
+
+        replace_file(tmp_sidecar, sidecar)
+
+    except (IOError, OSError):
+        if os.path.exists(tmp_sidecar):
+            os.remove(tmp_sidecar)
+        return None
+
+    return sidecar
+
+
+def read_mesh_cache(path):
+    """
+    Reads the binary sidecar of an .obj file, if it is up to date.
+    The sidecar is considered up to date if the size of the .obj file matches and either the modification time or the
+    content hash matches. The sidecar is memory mapped, when mmap is available.
+
+    :param path: Path of the .obj file.
+    :return: Flat vertex array and flat face array or None if there is no valid sidecar.
+    :rtype: tuple
+    """
+
+    sidecar = cache_path(path)
+
+    if not os.path.isfile(sidecar) or not os.path.isfile(path):
+        return None
+
+    stat = os.stat(path)
+
+    with open(sidecar, 'rb') as file_obj:
+        if mmap:
+            try:
+                buffer_ = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                return None
+        else:
+            buffer_ = file_obj.read()
+
+        try:
+            if len(buffer_) < cache_header.size:
+                return None
+
+            magic, version, size, mtime, digest, vertex_count, face_count = \
+                cache_header.unpack(buffer_[:cache_header.size])
+
+            if magic != cache_magic or version != cache_version or size != stat.st_size:
+                return None
+
+            if mtime != stat.st_mtime and digest != file_hash(path):
+                return None
+
+            vertex_end = cache_header.size + vertex_count * 3 * 8
+            face_end = vertex_end + face_count * 4 * 4
+            if len(buffer_) != face_end:
+                return None
+
+            vertices = from_little_endian(array_from_bytes('d', buffer_[cache_header.size:vertex_end]))
+            faces = from_little_endian(array_from_bytes('i', buffer_[vertex_end:face_end]))
+
+        finally:
+            if mmap:
+                buffer_.close()
+
+    if mtime != stat.st_mtime:
+        # Content is unchanged, so only the stored modification time needs to be refreshed
+        with open(sidecar, 'r+b') as file_obj:
+            file_obj.write(cache_header.pack(magic, version, size, stat.st_mtime, digest, vertex_count, face_count))
+
+    return vertices, faces
+
+
+def array_to_bytes(array_):
+    """Returns the raw bytes of a typed array."""
+
+    if hasattr(array_, 'tobytes'):
+        return array_.tobytes()
+    else:
+        return array_.tostring()
+
+
+def array_from_bytes(type_code, bytes_):
+    """Creates a typed array from raw bytes."""
+
+    array_ = array(type_code)
+
+    if hasattr(array_, 'frombytes'):
+        array_.frombytes(bytes_)
+    else:
+        array_.fromstring(bytes_)
+
+    return array_
+
+
+def to_little_endian(array_):
+    """Byte swaps a typed array in place on big-endian machines, so it can be written as little-endian."""
+
+    if sys.byteorder == 'big':
+        array_.byteswap()
+
+    return array_
+
+
+# Swapping is symmetric, so reading uses the same operation as writing.
+from_little_endian = to_little_endian
+
+
+def replace_file(source, destination):
+    """Moves a file into place, overwriting the destination if it exists."""
+
+    if os.path.exists(destination):
+        os.remove(destination)
+
+    os.rename(source, destination)
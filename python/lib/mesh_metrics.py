@@ -0,0 +1,103 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import math
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Mesh Metrics
+#
+# Per face metrics computed from the flat vertex and face arrays used in livestock.lib.mesh_io.
+
+
+def face_metrics(vertices, faces):
+    """
+    Computes the area, centroid, normal, slope and aspect of all faces in one pass over the vertex and face arrays.
+
+    | Areas are computed from the vector area of each face. For quads that is half the cross product of the diagonals.
+    | Centroids are the average of the face corners, as rhinoscriptsyntax.MeshFaceCenters.
+    | Normals are unit vectors.
+    | Slopes are the angle between the face and the horizontal plane in degrees.
+    | Aspects are the compass direction the face is facing in degrees. 0 is north (+Y) and 90 is east (+X).
+    | Horizontal faces have an aspect of -1.
+
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array with four indices per face.
+    :return: Dict with the arrays: area, centroid (x, y, z per face), normal (x, y, z per face), slope and aspect.
+    :rtype: dict
+    """
+
+    face_count = len(faces) // 4
+    area = array('d', [0.0]) * face_count
+    centroid = array('d', [0.0]) * (3 * face_count)
+    normal = array('d', [0.0]) * (3 * face_count)
+    slope = array('d', [0.0]) * face_count
+    aspect = array('d', [0.0]) * face_count
+
+    sqrt = math.sqrt
+    degrees = math.degrees
+    atan2 = math.atan2
+
+    for i in range(face_count):
+        a = 3 * faces[4 * i]
+        b = 3 * faces[4 * i + 1]
+        c = 3 * faces[4 * i + 2]
+        d = 3 * faces[4 * i + 3]
+
+        ax, ay, az = vertices[a], vertices[a + 1], vertices[a + 2]
+        bx, by, bz = vertices[b], vertices[b + 1], vertices[b + 2]
+        cx, cy, cz = vertices[c], vertices[c + 1], vertices[c + 2]
+
+        if c == d:
+            # Triangle
+            ux, uy, uz = bx - ax, by - ay, bz - az
+            vx, vy, vz = cx - ax, cy - ay, cz - az
+            centroid[3 * i] = (ax + bx + cx) / 3.0
+            centroid[3 * i + 1] = (ay + by + cy) / 3.0
+            centroid[3 * i + 2] = (az + bz + cz) / 3.0
+
+        else:
+            # Quad
+            dx, dy, dz = vertices[d], vertices[d + 1], vertices[d + 2]
+            ux, uy, uz = cx - ax, cy - ay, cz - az
+            vx, vy, vz = dx - bx, dy - by, dz - bz
+            centroid[3 * i] = (ax + bx + cx + dx) / 4.0
+            centroid[3 * i + 1] = (ay + by + cy + dy) / 4.0
+            centroid[3 * i + 2] = (az + bz + cz + dz) / 4.0
+
+        nx = uy * vz - uz * vy
+        ny = uz * vx - ux * vz
+        nz = ux * vy - uy * vx
+        length = sqrt(nx * nx + ny * ny + nz * nz)
+        area[i] = 0.5 * length
+
+        if length:
+            nx, ny, nz = nx / length, ny / length, nz / length
+            normal[3 * i] = nx
+            normal[3 * i + 1] = ny
+            normal[3 * i + 2] = nz
+
+        horizontal = sqrt(nx * nx + ny * ny)
+        slope[i] = degrees(atan2(horizontal, abs(nz)))
+
+        if horizontal and nz < 0:
+            # Face normal points downwards, so the face is facing the opposite direction
+            aspect[i] = degrees(atan2(-nx, -ny)) % 360.0
+        elif horizontal:
+            aspect[i] = degrees(atan2(nx, ny)) % 360.0
+        else:
+            aspect[i] = -1.0
+
+    return {'area': area,
+            'centroid': centroid,
+            'normal': normal,
+            'slope': slope,
+            'aspect': aspect}
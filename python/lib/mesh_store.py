@@ -0,0 +1,198 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import hashlib
+import os
+import shutil
+import tempfile
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+import livestock.lib.mesh_topology as mesh_topology
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Mesh Store
+#
+# Meshes are stored once in the mesh store under a name derived from a hash of their vertex and face data.
+# Writing a mesh that is already in the store costs nothing and case folders get the mesh through a hard link, or a
+# copy where hard links are not supported. The least recently used meshes are evicted when the store grows too big.
+# Each stored mesh has its face adjacency stored next to it (<mesh name>.lsadj), which is placed along with the mesh.
+
+store_path = os.path.join(tempfile.gettempdir(), 'livestock')
+max_store_size = 2 * 1024 ** 3
+
+
+def mesh_hash(vertices, faces):
+    """
+    Computes the content hash of a mesh.
+
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array.
+    :return: Hexadecimal SHA-1 digest.
+    :rtype: str
+    """
+
+    digest = hashlib.sha1()
+    digest.update(mesh_io.array_to_bytes(mesh_io.to_little_endian(array('d', vertices))))
+    digest.update(mesh_io.array_to_bytes(mesh_io.to_little_endian(array('i', faces))))
+
+    return digest.hexdigest()
+
+
+def mesh_file(mesh_name, store=store_path):
+    """Returns the path of a mesh in the store."""
+
+    return os.path.join(store, mesh_name + '.obj')
+
+
+def store_mesh(vertices, faces, store=store_path, max_size=None):
+    """
+    Adds a mesh to the mesh store, unless an identical mesh is already stored.
+
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array.
+    :param store: Folder of the mesh store.
+    :param max_size: Maximum size of the store in bytes. Default is max_store_size.
+    :return: Mesh name. The mesh is found in the store as <mesh name>.obj
+    :rtype: str
+    """
+
+    if not os.path.exists(store):
+        os.makedirs(store)
+
+    mesh_name = 'mesh_' + mesh_hash(vertices, faces)
+    path = mesh_file(mesh_name, store)
+
+    if os.path.exists(path):
+        touch(path)
+
+    else:
+        # The temporary name does not match mesh_*.obj, so a concurrent evict() does not see the half written file
+        tmp_path = mesh_io.write_obj(os.path.join(store, 'tmp_' + mesh_name), vertices, faces)
+        mesh_io.replace_file(tmp_path, path)
+        evict(store, max_size, keep=[path, ])
+
+    mesh_topology.mesh_adjacency(path, faces)
+
+    return mesh_name
+
+
+def place_mesh(mesh_name, folder, store=store_path):
+    """
+    Places a stored mesh and its face adjacency, if stored, in a folder.
+    The files are hard linked into the folder if possible, otherwise they are copied.
+    Files placed in a folder should therefore not be modified in place.
+
+    :param mesh_name: Name of the mesh in the store.
+    :param folder: Folder to place the mesh in.
+    :param store: Folder of the mesh store.
+    :return: Paths of the placed files.
+    :rtype: list
+    """
+
+    source = mesh_file(mesh_name, store)
+
+    if not os.path.exists(source):
+        raise IOError('Could not find mesh: ' + str(mesh_name) + ' in the mesh store: ' + str(store))
+
+    touch(source)
+    placed = [place_file(source, folder), ]
+
+    adjacency = mesh_topology.adjacency_path(source)
+    if os.path.exists(adjacency):
+        placed.append(place_file(adjacency, folder))
+
+    return placed
+
+
+def place_file(source, folder):
+    """
+    Hard links or copies a stored file into a folder.
+
+    :param source: Path of the stored file.
+    :param folder: Folder to place the file in.
+    :return: Path of the placed file.
+    :rtype: str
+    """
+
+    destination = os.path.join(folder, os.path.basename(source))
+
+    if os.path.exists(destination):
+        if os.path.getsize(destination) == os.path.getsize(source):
+            # The name is content addressed, so the destination is already up to date
+            return destination
+        os.remove(destination)
+
+    try:
+        os.link(source, destination)
+    except (AttributeError, OSError):
+        shutil.copyfile(source, destination)
+
+    return destination
+
+
+def evict(store=store_path, max_size=None, keep=()):
+    """
+    Removes the least recently used meshes from the store until its total size is below max_size.
+
+    :param store: Folder of the mesh store.
+    :param max_size: Maximum size of the store in bytes. Default is max_store_size.
+    :param keep: Paths that should not be removed.
+    :return: Number of removed meshes.
+    :rtype: int
+    """
+
+    if max_size is None:
+        max_size = max_store_size
+
+    meshes = []
+    total_size = 0
+    for file_ in os.listdir(store):
+        if file_.startswith('mesh_') and file_.endswith('.obj'):
+            path = os.path.join(store, file_)
+            stat = os.stat(path)
+            size = stat.st_size
+
+            adjacency = mesh_topology.adjacency_path(path)
+            if os.path.exists(adjacency):
+                size += os.path.getsize(adjacency)
+
+            meshes.append((stat.st_mtime, size, path))
+            total_size += size
+
+    removed = 0
+    for mtime, size, path in sorted(meshes):
+        if total_size <= max_size:
+            break
+
+        if path in keep:
+            continue
+
+        try:
+            os.remove(path)
+            adjacency = mesh_topology.adjacency_path(path)
+            if os.path.exists(adjacency):
+                os.remove(adjacency)
+        except OSError:
+            continue
+
+        total_size -= size
+        removed += 1
+
+    return removed
+
+
+def touch(path):
+    """Marks a file as recently used by updating its modification time."""
+
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
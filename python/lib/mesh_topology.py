@@ -0,0 +1,214 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import hashlib
+import os
+import struct
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Mesh Topology
+#
+# Face adjacency is stored in compressed sparse row (CSR) form:
+# The neighbours of face i are neighbours[offsets[i]:offsets[i + 1]].
+# Faces are neighbours when they share an edge.
+
+adjacency_extension = '.lsadj'
+adjacency_magic = b'LSADJ'
+adjacency_version = 1
+
+# Magic, version, sha1 of the face array, face count, neighbour count
+adjacency_header = struct.Struct('<5sH20sqq')
+
+
+def face_adjacency(faces):
+    """
+    Builds the face adjacency of a mesh by hashing its edges.
+    Every edge is looked up once, so the adjacency is built in close to linear time.
+
+    :param faces: Flat face array with four indices per face. Triangles repeat their last index.
+    :return: Offset array (face count + 1) and neighbour array.
+    :rtype: tuple
+    """
+
+    face_count = len(faces) // 4
+    if not face_count:
+        return array('i', [0]), array('i')
+
+    vertex_count = max(faces) + 1
+    edges = {}
+    first_faces = array('i')
+    second_faces = array('i')
+
+    for face in range(face_count):
+        a, b, c, d = faces[4 * face:4 * face + 4]
+
+        if c == d:
+            corners = (a, b, c, a)
+        else:
+            corners = (a, b, c, d, a)
+
+        for j in range(len(corners) - 1):
+            u = corners[j]
+            v = corners[j + 1]
+            if u < v:
+                key = u * vertex_count + v
+            else:
+                key = v * vertex_count + u
+
+            shared = edges.get(key)
+
+            if shared is None:
+                edges[key] = face
+
+            elif isinstance(shared, tuple):
+                # Non-manifold edge shared by more than two faces
+                for other in shared:
+                    first_faces.append(other)
+                    second_faces.append(face)
+                edges[key] = shared + (face, )
+
+            else:
+                first_faces.append(shared)
+                second_faces.append(face)
+                edges[key] = (shared, face)
+
+    # Count neighbours and convert the counts into offsets
+    offsets = array('i', [0]) * (face_count + 1)
+    for face in first_faces:
+        offsets[face + 1] += 1
+    for face in second_faces:
+        offsets[face + 1] += 1
+    for face in range(face_count):
+        offsets[face + 1] += offsets[face]
+
+    # Fill in the neighbours
+    neighbours = array('i', [0]) * offsets[face_count]
+    cursor = array('i', offsets[:face_count])
+    for first, second in zip(first_faces, second_faces):
+        neighbours[cursor[first]] = second
+        cursor[first] += 1
+        neighbours[cursor[second]] = first
+        cursor[second] += 1
+
+    return offsets, neighbours
+
+
+def face_neighbours(offsets, neighbours, face):
+    """
+    Returns the neighbours of a face.
+
+    :param offsets: Offset array of the adjacency.
+    :param neighbours: Neighbour array of the adjacency.
+    :param face: Face index.
+    :return: Indices of the neighbouring faces.
+    :rtype: array
+    """
+
+    return neighbours[offsets[face]:offsets[face + 1]]
+
+
+def faces_digest(faces):
+    """Returns the SHA-1 digest of a face array. Used to check whether a stored adjacency belongs to a mesh."""
+
+    return hashlib.sha1(mesh_io.array_to_bytes(mesh_io.to_little_endian(array('i', faces)))).digest()
+
+
+def adjacency_path(path):
+    """Returns the path of the adjacency sidecar belonging to an .obj file."""
+
+    return os.path.splitext(path)[0] + adjacency_extension
+
+
+def write_adjacency(path, offsets, neighbours, digest):
+    """
+    Writes a face adjacency to a binary file.
+
+    :param path: File path.
+    :param offsets: Offset array of the adjacency.
+    :param neighbours: Neighbour array of the adjacency.
+    :param digest: SHA-1 digest of the face array, the adjacency was built from.
+    :return: File path.
+    :rtype: str
+    """
+
+    tmp_path = path + '.tmp'
+
+    with open(tmp_path, 'wb') as file_obj:
+        file_obj.write(adjacency_header.pack(adjacency_magic, adjacency_version, digest,
+                                             len(offsets) - 1, len(neighbours)))
+        file_obj.write(mesh_io.array_to_bytes(mesh_io.to_little_endian(array('i', offsets))))
+        file_obj.write(mesh_io.array_to_bytes(mesh_io.to_little_endian(array('i', neighbours))))
+
+    mesh_io.replace_file(tmp_path, path)
+
+    return path
+
+
+def read_adjacency(path, digest=None):
+    """
+    Reads a face adjacency from a binary file.
+
+    :param path: File path.
+    :param digest: If given, the adjacency is only returned if it was built from a face array with this digest.
+    :return: Offset array and neighbour array or None if the file is missing or does not match.
+    :rtype: tuple
+    """
+
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, 'rb') as file_obj:
+        header = file_obj.read(adjacency_header.size)
+        if len(header) != adjacency_header.size:
+            return None
+
+        magic, version, stored_digest, face_count, neighbour_count = adjacency_header.unpack(header)
+        if magic != adjacency_magic or version != adjacency_version:
+            return None
+
+        if digest is not None and digest != stored_digest:
+            return None
+
+        offsets = mesh_io.from_little_endian(mesh_io.array_from_bytes('i', file_obj.read(4 * (face_count + 1))))
+        neighbours = mesh_io.from_little_endian(mesh_io.array_from_bytes('i', file_obj.read(4 * neighbour_count)))
+
+    return offsets, neighbours
+
+
+def mesh_adjacency(path, faces):
+    """
+    Returns the face adjacency of the mesh in an .obj file.
+    The adjacency is read from the sidecar (<name>.lsadj) next to the .obj file, if it belongs to the given faces.
+    Otherwise it is built and the sidecar is written.
+
+    :param path: Path of the .obj file.
+    :param faces: Flat face array of the mesh.
+    :return: Offset array and neighbour array.
+    :rtype: tuple
+    """
+
+    digest = faces_digest(faces)
+    sidecar = adjacency_path(path)
+
+    adjacency = read_adjacency(sidecar, digest)
+    if adjacency:
+        return adjacency
+
+    offsets, neighbours = face_adjacency(faces)
+
+    try:
+        write_adjacency(sidecar, offsets, neighbours, digest)
+    except (IOError, OSError):
+        pass
+
+    return offsets, neighbours
@@ -5,7 +5,7 @@ __license__ = "GNU GPLv3 "
 # Imports
 
 # Module imports
-from System import Array
+from array import array
 import os
 import math
 
@@ -13,9 +13,14 @@ import math
 
 
 # Grasshopper imports
-import scriptcontext as sc
-from Grasshopper import DataTree as Tree
-from Grasshopper.Kernel.Data import GH_Path as Path
+try:
+    from System import Array
+    import scriptcontext as sc
+    from Grasshopper import DataTree as Tree
+    from Grasshopper.Kernel.Data import GH_Path as Path
+except ImportError:
+    # Outside of Rhino, e.g. when benchmarking. Trees are built with DataTreeStandIn instead.
+    Array = sc = Tree = Path = None
 
 
 # -------------------------------------------------------------------------------------------------------------------- #
@@ -53,7 +58,7 @@ def list_to_tree(input_, none_and_holes=True, source=[0]):
             tree.EnsurePath(path)
             return
         for i, item in enumerate(input_):
-            if hasattr(item, '__iter__'):  # if list or tuple
+            if hasattr(item, '__iter__') or isinstance(item, array):  # if list, tuple or array
                 track.append(i)
                 proc(item, tree, track)
                 track.pop()
@@ -69,6 +74,178 @@ def list_to_tree(input_, none_and_holes=True, source=[0]):
         return t
 
 
+def nested_to_flat(input_, source=(0, )):
+    """
+    | Flattens nestings of lists, tuples or arrays into a flat value list and branch offsets.
+    | The innermost sequences become branches. The branch paths are the same as list_to_tree() would give.
+
+    :param input_: Nested sequences, e.g. a list of float arrays or a list of lists of float arrays.
+    :param source: Path indices to put in front of the path of each branch.
+    :return: Flat values, branch offsets and branch paths. Branch i holds values[offsets[i]:offsets[i + 1]] and has
+             the path indices paths[i].
+    :rtype: tuple
+    """
+
+    values = []
+    offsets = array('i', [0])
+    paths = []
+    stack = [(input_, tuple(source)), ]
+
+    while stack:
+        item, track = stack.pop()
+
+        if len(item) and is_sequence(item[0]):
+            for index in reversed(range(len(item))):
+                stack.append((item[index], track + (index, )))
+
+        else:
+            values.extend(item)
+            offsets.append(len(values))
+            paths.append(track)
+
+    return values, offsets, paths
+
+
+def flat_to_tree(values, offsets, paths=None, tree=None):
+    """
+    | Builds a Grasshopper DataTree from flat values and branch offsets.
+    | Each branch is added with a single AddRange call, instead of inserting the values one at a time.
+
+    :param values: Flat sequence of values.
+    :param offsets: Branch offsets. Branch i holds values[offsets[i]:offsets[i + 1]].
+    :param paths: Path indices of each branch. Default is {i} for branch i.
+    :param tree: Empty tree to add the branches to. Default is a new DataTree or a DataTreeStandIn outside of
+                 Grasshopper.
+    :return: Tree
+    """
+
+    if tree is None:
+        tree = new_tree()
+
+    for branch in range(len(offsets) - 1):
+        if paths is None:
+            path = tree_path((branch, ))
+        else:
+            path = tree_path(paths[branch])
+
+        start = offsets[branch]
+        end = offsets[branch + 1]
+
+        if start == end:
+            tree.EnsurePath(path)
+        else:
+            tree.AddRange(list(values[start:end]), path)
+
+    return tree
+
+
+def tree_to_flat(tree_input):
+    """
+    Returns the values of a Grasshopper DataTree as flat values and branch offsets.
+
+    :param tree_input: DataTree or DataTreeStandIn.
+    :return: Flat values, branch offsets and branch paths, see nested_to_flat(). The values are a float array if all
+             values are numbers, otherwise a list.
+    :rtype: tuple
+    """
+
+    values = []
+    offsets = array('i', [0])
+    paths = []
+
+    for i in range(tree_input.BranchCount):
+        values.extend(tree_input.Branch(i))
+        offsets.append(len(values))
+        paths.append(path_indices(tree_input.Path(i)))
+
+    try:
+        values = array('d', values)
+    except TypeError:
+        pass
+
+    return values, offsets, paths
+
+
+def arrays_to_tree(input_, source=(0, )):
+    """
+    Transforms nested result arrays, e.g. from livestock.lib.cmf_lib, into a Grasshopper DataTree in bulk.
+    Gives the same tree as list_to_tree().
+
+    :param input_: Nested sequences, e.g. a list of float arrays or a list of lists of float arrays.
+    :param source: Path indices to put in front of the path of each branch.
+    :return: Tree
+    """
+
+    return flat_to_tree(*nested_to_flat(input_, source))
+
+
+def is_sequence(item):
+    """Checks if an item is a list, tuple or array."""
+
+    return isinstance(item, (list, tuple, array))
+
+
+def new_tree():
+    """Returns an empty DataTree or a DataTreeStandIn outside of Grasshopper."""
+
+    if Tree is None:
+        return DataTreeStandIn()
+    else:
+        return Tree[object]()
+
+
+def tree_path(indices):
+    """Returns a GH_Path of path indices or the indices as a tuple outside of Grasshopper."""
+
+    if Path is None:
+        return tuple(indices)
+    else:
+        return Path(Array[int](list(indices)))
+
+
+def path_indices(path):
+    """Returns the indices of a GH_Path or tuple path as a tuple."""
+
+    if isinstance(path, tuple):
+        return path
+    else:
+        return tuple(path.Indices)
+
+
+class DataTreeStandIn:
+    """
+    | A minimal stand-in for the Grasshopper DataTree, so trees can be built and benchmarked outside of Rhino.
+    | Paths are tuples of indices.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.branches = {}
+
+    @property
+    def BranchCount(self):
+        return len(self.paths)
+
+    def EnsurePath(self, path):
+        if path not in self.branches:
+            self.paths.append(path)
+            self.branches[path] = []
+
+        return self.branches[path]
+
+    def Add(self, item, path):
+        self.EnsurePath(path).append(item)
+
+    def AddRange(self, items, path):
+        self.EnsurePath(path).extend(items)
+
+    def Branch(self, index):
+        return self.branches[self.paths[index]]
+
+    def Path(self, index):
+        return self.paths[index]
+
+
 class PassClass:
     """Pass a class from one Grasshopper component to another."""
 
@@ -0,0 +1,317 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Ray Tracing
+#
+# Rays are traced against the triangles of a mesh given as the flat vertex and face arrays used in
+# livestock.lib.mesh_io. Quads are split into two triangles. The triangles are held in a bounding volume hierarchy
+# (BVH), so each ray is only tested against the triangles in the boxes it passes through. The triangles in a leaf
+# are tested with the Moller-Trumbore algorithm.
+# The tolerance of the hit distance is relative to the largest coordinate of the mesh, as the precision of the hit
+# points decreases with the size of the coordinates, e.g. at site coordinates.
+# A reflected ray starts slightly before the hit point, back along the incoming ray. It starts on the side of the hit
+# plane it is reflected to, so it can not hit the same face again, but it still hits a face sharing the hit point, e.g.
+# when a ray is reflected exactly on the inner edge between two faces.
+
+epsilon = 1e-9
+# Relative to the largest coordinate of the mesh
+hit_tolerance = 1e-12
+bounce_offset = 1e-9
+no_direction = 1e30
+
+
+class RayTracer:
+    """
+    | Traces rays against a mesh.
+    | The BVH nodes are stored in flat arrays. Node i has the bounding box node_bounds[6 * i:6 * i + 6] (min x, y, z
+    | and max x, y, z). Inner nodes have their children at node_child[i] and node_child[i] + 1. Leaves have a
+    | node_child of -1 and hold the triangles order[node_start[i]:node_start[i] + node_count[i]].
+    """
+
+    def __init__(self, vertices, faces, leaf_size=4):
+        """
+        Triangulates the mesh and builds the BVH.
+
+        :param vertices: Flat vertex array.
+        :param faces: Flat face array with four indices per face. Triangles repeat their last index.
+        :param leaf_size: Maximum number of triangles in a BVH leaf.
+        """
+
+        self.leaf_size = leaf_size
+
+        # Triangle corner and edge vectors: v0, e1 = v1 - v0 and e2 = v2 - v0
+        self.triangles = array('d')
+        self.triangle_faces = array('i')
+
+        for face in range(len(faces) // 4):
+            a, b, c, d = faces[4 * face:4 * face + 4]
+            self.add_triangle(vertices, a, b, c, face)
+            if c != d:
+                self.add_triangle(vertices, a, c, d, face)
+
+        self.triangle_count = len(self.triangle_faces)
+        self.order = array('i', range(self.triangle_count))
+        self.node_bounds = array('d')
+        self.node_child = array('i')
+        self.node_start = array('i')
+        self.node_count = array('i')
+
+        self.build()
+
+        # Absolute distance tolerance and the distance a reflected ray starts before the hit point
+        if self.triangle_count:
+            scale = max(max([abs(bound) for bound in self.node_bounds[0:6]]), 1.0)
+        else:
+            scale = 1.0
+        self.epsilon = hit_tolerance * scale
+        self.offset = bounce_offset * scale
+
+    def add_triangle(self, vertices, a, b, c, face):
+        """Adds a triangle by its vertex indices."""
+
+        ax, ay, az = vertices[3 * a], vertices[3 * a + 1], vertices[3 * a + 2]
+        self.triangles.extend((ax, ay, az,
+                               vertices[3 * b] - ax, vertices[3 * b + 1] - ay, vertices[3 * b + 2] - az,
+                               vertices[3 * c] - ax, vertices[3 * c + 1] - ay, vertices[3 * c + 2] - az))
+        self.triangle_faces.append(face)
+
+    def triangle_bounds(self, triangle):
+        """Returns the bounding box of a triangle as min x, y, z and max x, y, z."""
+
+        t = self.triangles[9 * triangle:9 * triangle + 9]
+        xs = (t[0], t[0] + t[3], t[0] + t[6])
+        ys = (t[1], t[1] + t[4], t[1] + t[7])
+        zs = (t[2], t[2] + t[5], t[2] + t[8])
+
+        return min(xs), min(ys), min(zs), max(xs), max(ys), max(zs)
+
+    def add_node(self, start, count):
+        """Adds a BVH node covering order[start:start + count] and returns its index."""
+
+        bounds = [float('inf')] * 3 + [float('-inf')] * 3
+        for triangle in self.order[start:start + count]:
+            box = self.triangle_bounds(triangle)
+            for k in range(3):
+                if box[k] < bounds[k]:
+                    bounds[k] = box[k]
+                if box[k + 3] > bounds[k + 3]:
+                    bounds[k + 3] = box[k + 3]
+
+        self.node_bounds.extend(bounds)
+        self.node_child.append(-1)
+        self.node_start.append(start)
+        self.node_count.append(count)
+
+        return len(self.node_child) - 1
+
+    def build(self):
+        """Builds the BVH by splitting the triangles at the median centroid along the longest axis."""
+
+        if not self.triangle_count:
+            return
+
+        triangles = self.triangles
+        stack = [self.add_node(0, self.triangle_count), ]
+
+        while stack:
+            node = stack.pop()
+            start = self.node_start[node]
+            count = self.node_count[node]
+
+            if count <= self.leaf_size:
+                continue
+
+            bounds = self.node_bounds[6 * node:6 * node + 6]
+            extents = [bounds[k + 3] - bounds[k] for k in range(3)]
+            axis = extents.index(max(extents))
+
+            # Triangle centroid along the axis (times 3)
+            def centroid(triangle):
+                return 3 * triangles[9 * triangle + axis] + triangles[9 * triangle + 3 + axis] + \
+                       triangles[9 * triangle + 6 + axis]
+
+            self.order[start:start + count] = array('i', sorted(self.order[start:start + count], key=centroid))
+
+            half = count // 2
+            left = self.add_node(start, half)
+            self.add_node(start + half, count - half)
+            self.node_child[node] = left
+
+            stack.append(left)
+            stack.append(left + 1)
+
+    def intersect(self, ox, oy, oz, dx, dy, dz):
+        """
+        Finds the closest triangle hit by a ray.
+
+        :param ox: Ray origin x.
+        :param oy: Ray origin y.
+        :param oz: Ray origin z.
+        :param dx: Ray direction x.
+        :param dy: Ray direction y.
+        :param dz: Ray direction z.
+        :return: Distance along the ray (in units of the direction length) and triangle index. -1 if nothing is hit.
+        :rtype: tuple
+        """
+
+        if not self.triangle_count:
+            return -1.0, -1
+
+        triangles = self.triangles
+        bounds = self.node_bounds
+        child = self.node_child
+        order = self.order
+        distance_epsilon = self.epsilon
+
+        ix = 1.0 / dx if dx else no_direction
+        iy = 1.0 / dy if dy else no_direction
+        iz = 1.0 / dz if dz else no_direction
+
+        best_distance = float('inf')
+        best_triangle = -1
+        stack = [0, ]
+
+        while stack:
+            node = stack.pop()
+
+            # Slab test against the bounding box
+            b = 6 * node
+            t0 = (bounds[b] - ox) * ix
+            t1 = (bounds[b + 3] - ox) * ix
+            near, far = (t0, t1) if t0 < t1 else (t1, t0)
+            t0 = (bounds[b + 1] - oy) * iy
+            t1 = (bounds[b + 4] - oy) * iy
+            if t0 > t1:
+                t0, t1 = t1, t0
+            near, far = max(near, t0), min(far, t1)
+            t0 = (bounds[b + 2] - oz) * iz
+            t1 = (bounds[b + 5] - oz) * iz
+            if t0 > t1:
+                t0, t1 = t1, t0
+            near, far = max(near, t0), min(far, t1)
+
+            if near > far or far < 0 or near > best_distance:
+                continue
+
+            if child[node] >= 0:
+                stack.append(child[node])
+                stack.append(child[node] + 1)
+                continue
+
+            # Moller-Trumbore against the triangles in the leaf
+            start = self.node_start[node]
+            for triangle in order[start:start + self.node_count[node]]:
+                t = 9 * triangle
+                e1x, e1y, e1z = triangles[t + 3], triangles[t + 4], triangles[t + 5]
+                e2x, e2y, e2z = triangles[t + 6], triangles[t + 7], triangles[t + 8]
+
+                px = dy * e2z - dz * e2y
+                py = dz * e2x - dx * e2z
+                pz = dx * e2y - dy * e2x
+                determinant = e1x * px + e1y * py + e1z * pz
+                if -epsilon < determinant < epsilon:
+                    continue
+                inverse = 1.0 / determinant
+
+                tx = ox - triangles[t]
+                ty = oy - triangles[t + 1]
+                tz = oz - triangles[t + 2]
+                u = (tx * px + ty * py + tz * pz) * inverse
+                if u < 0.0 or u > 1.0:
+                    continue
+
+                qx = ty * e1z - tz * e1y
+                qy = tz * e1x - tx * e1z
+                qz = tx * e1y - ty * e1x
+                v = (dx * qx + dy * qy + dz * qz) * inverse
+                if v < 0.0 or u + v > 1.0:
+                    continue
+
+                distance = (e2x * qx + e2y * qy + e2z * qz) * inverse
+                if distance_epsilon < distance < best_distance:
+                    best_distance = distance
+                    best_triangle = triangle
+
+        if best_triangle < 0:
+            return -1.0, -1
+
+        return best_distance, best_triangle
+
+    def reflect(self, triangle, dx, dy, dz):
+        """Reflects a direction in the plane of a triangle."""
+
+        t = 9 * triangle
+        e1x, e1y, e1z = self.triangles[t + 3], self.triangles[t + 4], self.triangles[t + 5]
+        e2x, e2y, e2z = self.triangles[t + 6], self.triangles[t + 7], self.triangles[t + 8]
+        nx = e1y * e2z - e1z * e2y
+        ny = e1z * e2x - e1x * e2z
+        nz = e1x * e2y - e1y * e2x
+        scale = 2.0 * (dx * nx + dy * ny + dz * nz) / (nx * nx + ny * ny + nz * nz)
+
+        return dx - scale * nx, dy - scale * ny, dz - scale * nz
+
+    def trace(self, origins, directions, bounces=0):
+        """
+        Traces a batch of rays with a number of specular bounces.
+        Every ray gets bounces + 1 entries in the result arrays, one for each hit.
+        Once a ray misses the mesh, its remaining entries have a face of -1, a distance of -1 and NaN points.
+
+        :param origins: Flat ray origin array: x, y, z, x, y, z, ...
+        :param directions: Flat ray direction array. The directions are normalized.
+        :param bounces: Number of times each ray is reflected.
+        :return: Dict with the arrays: points (hit points), faces (hit face indices), distances (length of each ray
+                 segment) and directions (normalized direction after each hit).
+        :rtype: dict
+        """
+
+        hits_per_ray = bounces + 1
+        ray_count = len(origins) // 3
+        nan = float('nan')
+
+        points = array('d', [nan]) * (3 * hits_per_ray * ray_count)
+        directions_out = array('d', [nan]) * (3 * hits_per_ray * ray_count)
+        faces = array('i', [-1]) * (hits_per_ray * ray_count)
+        distances = array('d', [-1.0]) * (hits_per_ray * ray_count)
+
+        for ray in range(ray_count):
+            ox, oy, oz = origins[3 * ray], origins[3 * ray + 1], origins[3 * ray + 2]
+            dx, dy, dz = directions[3 * ray], directions[3 * ray + 1], directions[3 * ray + 2]
+            length = (dx * dx + dy * dy + dz * dz) ** 0.5
+            if not length:
+                continue
+            dx, dy, dz = dx / length, dy / length, dz / length
+            px, py, pz = ox, oy, oz
+
+            for bounce in range(hits_per_ray):
+                distance, triangle = self.intersect(ox, oy, oz, dx, dy, dz)
+                if triangle < 0:
+                    break
+
+                hx, hy, hz = ox + distance * dx, oy + distance * dy, oz + distance * dz
+
+                entry = ray * hits_per_ray + bounce
+                points[3 * entry:3 * entry + 3] = array('d', (hx, hy, hz))
+                faces[entry] = self.triangle_faces[triangle]
+                distances[entry] = ((hx - px) ** 2 + (hy - py) ** 2 + (hz - pz) ** 2) ** 0.5
+                px, py, pz = hx, hy, hz
+
+                # The reflected ray starts back along the incoming ray
+                ox, oy, oz = hx - self.offset * dx, hy - self.offset * dy, hz - self.offset * dz
+                dx, dy, dz = self.reflect(triangle, dx, dy, dz)
+                directions_out[3 * entry:3 * entry + 3] = array('d', (dx, dy, dz))
+
+        return {'points': points,
+                'faces': faces,
+                'distances': distances,
+                'directions': directions_out}
@@ -0,0 +1,342 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import json
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+# Livestock imports
+import livestock.lib.cmf_lib as cmf_lib
+import livestock.lib.mesh_io as mesh_io
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Result Export
+#
+# Exports the mesh and results of a CMF case for post-processing in e.g. ParaView.
+# The mesh of a case is the meshes of the grounds in ground.json joined in order, so face i of the joined mesh is
+# cell i. The results are read from the result store of the case (see livestock.lib.result_store).
+#
+# Two formats are written:
+# - XDMF: An .xdmf file with a frame per time step. The heavy data are the raw value files of the result store, which
+#   are referenced with hyperslabs, so nothing is copied and ParaView only reads the frames it shows.
+# - VTK: A binary legacy .vtk unstructured grid file per time step. The results are read from the store in blocks of
+#   time steps, so the memory used is bounded by the memory budget and not by the length of the simulation.
+
+# VTK and XDMF cell type codes of triangles and quads
+vtk_cell_types = {3: 5, 4: 9}
+xdmf_cell_types = {3: 4, 4: 5}
+
+xdmf_geometry_file = 'mesh_geometry.bin'
+xdmf_topology_file = 'mesh_topology.bin'
+
+
+def case_mesh(case_folder):
+    """
+    Loads the mesh of a CMF case by joining the ground meshes in the order of ground.json.
+
+    :param case_folder: Folder of the case.
+    :return: Flat vertex array and flat face array, with one face per cell.
+    :rtype: tuple
+    """
+
+    with open(os.path.join(case_folder, 'ground.json'), 'r') as ground_file:
+        grounds = json.load(ground_file)
+
+    vertices = array('d')
+    faces = array('i')
+
+    for ground in grounds:
+        ground_vertices, ground_faces = mesh_io.load_obj(os.path.join(case_folder, ground['mesh'] + '.obj'),
+                                                         use_cache=False)
+        offset = len(vertices) // 3
+        vertices.extend(ground_vertices)
+        faces.extend(index + offset
+                     for index in ground_faces)
+
+    return vertices, faces
+
+
+def face_corners(faces, face):
+    """Returns the vertex indices of a face from a flat face array. Triangles have three indices and quads four."""
+
+    a, b, c, d = faces[4 * face:4 * face + 4]
+
+    if c == d:
+        return a, b, c
+    else:
+        return a, b, c, d
+
+
+def export_attributes(store, result_types):
+    """
+    Lists the attributes to export. Layer results get an attribute per layer.
+
+    :param store: Result store of the case.
+    :param result_types: Names of the results to export.
+    :return: List of (attribute name, variables, layer) tuples. The attribute is the sum of the variables.
+    :rtype: list
+    """
+
+    attributes = []
+
+    for result_type in result_types:
+        variables = cmf_lib.result_variables([result_type, ])
+        missing = [variable
+                   for variable in variables
+                   if variable not in store.variables]
+        if missing:
+            raise KeyError('Result: %s was not part of the outputs of the simulation.' % ', '.join(missing))
+
+        if store.variable_info(variables[0])['level'] == 'cell':
+            attributes.append((result_type, variables, 0))
+        else:
+            for layer in range(store.layer_count(variables[0])):
+                attributes.append(('%s_layer_%i' % (result_type, layer), variables, layer))
+
+    return attributes
+
+
+def write_xdmf(case_folder, result_types, start=None, end=None, stride=None, name='results'):
+    """
+    | Writes an XDMF file with the mesh and results of a CMF case.
+    | The mesh is written as raw binary files next to the XDMF file and the results are read straight from the value
+    | files of the result store. The XDMF file should therefore be kept in the case folder.
+
+    :param case_folder: Folder of the case.
+    :param result_types: Names of the results to export.
+    :param start: First time or time step index to export. Default is the first time step.
+    :param end: Last time or time step index to export, which is included. Default is the last time step.
+    :param stride: Export every stride'th time step. Default is 1.
+    :param name: Name of the XDMF file.
+    :return: Path of the XDMF file.
+    :rtype: str
+    """
+
+    results_path = os.path.join(case_folder, 'results.json')
+    store = cmf_lib.open_result_store(results_path, cmf_lib.result_variables(result_types))
+
+    try:
+        attributes = export_attributes(store, result_types)
+        steps = store.time_slice(start, end, stride)
+        vertices, faces = case_mesh(case_folder)
+        face_count = len(faces) // 4
+
+        if face_count != store.cell_count:
+            raise ValueError('The case mesh has %i faces, but the results have %i cells'
+                             % (face_count, store.cell_count))
+
+        # Heavy data of the mesh
+        topology = array('i')
+        for face in range(face_count):
+            corners = face_corners(faces, face)
+            topology.append(xdmf_cell_types[len(corners)])
+            topology.extend(corners)
+
+        write_binary(os.path.join(case_folder, xdmf_geometry_file), vertices)
+        write_binary(os.path.join(case_folder, xdmf_topology_file), topology)
+
+        # Light data
+        root = ET.Element('Xdmf', Version='3.0')
+        domain = ET.SubElement(root, 'Domain')
+
+        topology_element = ET.SubElement(domain, 'Topology', Name='mesh', TopologyType='Mixed',
+                                         NumberOfElements=str(face_count))
+        binary_item(topology_element, xdmf_topology_file, str(len(topology)), 'Int', 4)
+
+        geometry_element = ET.SubElement(domain, 'Geometry', Name='mesh', GeometryType='XYZ')
+        binary_item(geometry_element, xdmf_geometry_file, '%i 3' % (len(vertices) // 3), 'Float', 8)
+
+        collection = ET.SubElement(domain, 'Grid', Name=name, GridType='Collection', CollectionType='Temporal')
+        store_folder = os.path.relpath(store.folder, case_folder)
+
+        for step in range(steps.start, steps.stop, steps.step):
+            grid = ET.SubElement(collection, 'Grid', Name='step_%i' % step, GridType='Uniform')
+            ET.SubElement(grid, 'Time', Value=str(step))
+            ET.SubElement(grid, 'Topology', Reference='XML').text = '/Xdmf/Domain/Topology[@Name="mesh"]'
+            ET.SubElement(grid, 'Geometry', Reference='XML').text = '/Xdmf/Domain/Geometry[@Name="mesh"]'
+
+            for attribute_name, variables, layer in attributes:
+                attribute = ET.SubElement(grid, 'Attribute', Name=attribute_name, AttributeType='Scalar',
+                                          Center='Cell')
+
+                if len(variables) == 1:
+                    parent = attribute
+                else:
+                    function = ' + '.join('$%i' % index
+                                          for index in range(len(variables)))
+                    parent = ET.SubElement(attribute, 'DataItem', ItemType='Function', Function=function,
+                                           Dimensions='%i 1 1' % face_count)
+
+                for variable in variables:
+                    hyperslab_item(parent, store, os.path.join(store_folder, store.variable_info(variable)['file']),
+                                   variable, layer, step)
+
+        xdmf_path = os.path.join(case_folder, name + '.xdmf')
+        ET.ElementTree(root).write(xdmf_path, xml_declaration=True)
+
+    finally:
+        store.close()
+
+    return xdmf_path
+
+
+def binary_item(parent, file_name, dimensions, number_type, precision):
+    """Adds a DataItem referencing a raw little-endian binary file to an XDMF element."""
+
+    item = ET.SubElement(parent, 'DataItem', Dimensions=dimensions, NumberType=number_type,
+                         Precision=str(precision), Format='Binary', Endian='Little')
+    item.text = file_name.replace(os.sep, '/')
+
+    return item
+
+
+def hyperslab_item(parent, store, file_name, variable, layer, step):
+    """Adds a DataItem selecting the values of all cells in a layer and time step from a result store file."""
+
+    cells = store.cell_count
+    layers = store.layer_count(variable)
+    steps = store.timestep_count
+
+    slab = ET.SubElement(parent, 'DataItem', ItemType='HyperSlab', Dimensions='%i 1 1' % cells, Type='HyperSlab')
+    selection = ET.SubElement(slab, 'DataItem', Dimensions='3 3', Format='XML')
+    selection.text = '0 %i %i 1 1 1 %i 1 1' % (layer, step, cells)
+
+    binary_item(slab, file_name, '%i %i %i' % (cells, layers, steps), 'Float', 8)
+
+    return slab
+
+
+def write_vtk(case_folder, result_types, output_folder=None, start=None, end=None, stride=None, name='results',
+              memory_budget=64 * 1024 ** 2):
+    """
+    | Writes a binary legacy VTK unstructured grid file per time step with the mesh and results of a CMF case.
+    | The files are named <name>_<time step>.vtk, which ParaView opens as a time series.
+
+    :param case_folder: Folder of the case.
+    :param result_types: Names of the results to export.
+    :param output_folder: Folder to write the files to. Default is a vtk folder in the case folder.
+    :param start: First time or time step index to export. Default is the first time step.
+    :param end: Last time or time step index to export, which is included. Default is the last time step.
+    :param stride: Export every stride'th time step. Default is 1.
+    :param name: Name of the files.
+    :param memory_budget: Maximum number of bytes of results to hold in memory at a time.
+    :return: Paths of the written files.
+    :rtype: list
+    """
+
+    if output_folder is None:
+        output_folder = os.path.join(case_folder, 'vtk')
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    results_path = os.path.join(case_folder, 'results.json')
+    store = cmf_lib.open_result_store(results_path, cmf_lib.result_variables(result_types))
+    written = []
+
+    try:
+        attributes = export_attributes(store, result_types)
+        steps = store.time_slice(start, end, stride)
+        vertices, faces = case_mesh(case_folder)
+        face_count = len(faces) // 4
+
+        if face_count != store.cell_count:
+            raise ValueError('The case mesh has %i faces, but the results have %i cells'
+                             % (face_count, store.cell_count))
+
+        geometry = vtk_geometry(vertices, faces)
+
+        # Number of time steps to read at a time
+        block_size = max(1, memory_budget // (8 * face_count * max(1, len(attributes))))
+        block_size *= steps.step
+        digits = len(str(max(0, steps.stop - 1)))
+
+        for block_start in range(steps.start, steps.stop, block_size):
+            block = slice(block_start, min(block_start + block_size, steps.stop), steps.step)
+
+            block_values = []
+            for attribute_name, variables, layer in attributes:
+                block_values.append([cmf_lib.add_series([store.read_series(variable, cell, layer, block)
+                                                         for variable in variables])
+                                     for cell in range(face_count)])
+
+            for frame, step in enumerate(range(block.start, block.stop, block.step)):
+                path = os.path.join(output_folder, '%s_%s.vtk' % (name, str(step).zfill(digits)))
+
+                with open(path, 'wb') as vtk_file:
+                    vtk_file.write(('# vtk DataFile Version 3.0\n'
+                                    'Livestock CMF results, time step %i\n'
+                                    'BINARY\n' % step).encode('ascii'))
+                    vtk_file.write(geometry)
+                    vtk_file.write(('CELL_DATA %i\n' % face_count).encode('ascii'))
+
+                    for (attribute_name, variables, layer), cell_series in zip(attributes, block_values):
+                        vtk_file.write(('SCALARS %s double 1\nLOOKUP_TABLE default\n'
+                                        % attribute_name).encode('ascii'))
+                        vtk_file.write(big_endian_bytes(array('d', [series[frame]
+                                                                    for series in cell_series])))
+                        vtk_file.write(b'\n')
+
+                written.append(path)
+
+    finally:
+        store.close()
+
+    return written
+
+
+def vtk_geometry(vertices, faces):
+    """
+    Encodes a mesh as the dataset part of a binary legacy VTK file.
+
+    :param vertices: Flat vertex array.
+    :param faces: Flat face array.
+    :return: Bytes of the dataset, points, cells and cell types sections.
+    :rtype: bytes
+    """
+
+    face_count = len(faces) // 4
+    cells = array('i')
+    cell_types = array('i')
+
+    for face in range(face_count):
+        corners = face_corners(faces, face)
+        cells.append(len(corners))
+        cells.extend(corners)
+        cell_types.append(vtk_cell_types[len(corners)])
+
+    return b''.join([('DATASET UNSTRUCTURED_GRID\nPOINTS %i double\n' % (len(vertices) // 3)).encode('ascii'),
+                     big_endian_bytes(array('d', vertices)),
+                     ('\nCELLS %i %i\n' % (face_count, len(cells))).encode('ascii'),
+                     big_endian_bytes(cells),
+                     ('\nCELL_TYPES %i\n' % face_count).encode('ascii'),
+                     big_endian_bytes(cell_types),
+                     b'\n'])
+
+
+def big_endian_bytes(array_):
+    """Returns the bytes of a typed array in big-endian byte order, as legacy VTK files require."""
+
+    if sys.byteorder == 'little':
+        array_ = array(array_.typecode, array_)
+        array_.byteswap()
+
+    return mesh_io.array_to_bytes(array_)
+
+
+def write_binary(path, array_):
+    """Writes a typed array as raw little-endian bytes."""
+
+    array_ = mesh_io.to_little_endian(array(array_.typecode, array_))
+
+    with open(path, 'wb') as binary_file:
+        binary_file.write(mesh_io.array_to_bytes(array_))
+
+    return path
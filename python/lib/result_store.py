@@ -0,0 +1,477 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import datetime
+import json
+import math
+import os
+import shutil
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+# Livestock imports
+import livestock.lib.json_stream as json_stream
+import livestock.lib.mesh_io as mesh_io
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Result Store
+#
+# A columnar store for CMF results. Every result variable is stored as one packed array of little-endian doubles
+# with the shape (cells, layers, time steps) in a <variable>.lsres file. Cell variables have a single layer.
+# A small JSON index (index.json) describes the dimensions, units and time axis of the stored variables.
+# The index is written last, so a store without an index is incomplete and is ignored.
+# The value files are memory mapped when read, so a single series can be read without reading the rest of the file.
+
+store_folder_name = 'results'
+index_name = 'index.json'
+value_extension = '.lsres'
+store_version = 1
+value_size = 8
+
+cell_variables = ('evaporation', 'transpiration', 'surface_water_volume', 'surface_water_flux', 'heat_flux')
+layer_variables = ('volumetric_flux', 'potential', 'theta', 'volume', 'wetness')
+
+result_units = {'evaporation': 'm3/day',
+                'transpiration': 'm3/day',
+                'surface_water_volume': 'm3',
+                'surface_water_flux': 'm3/day',
+                'heat_flux': 'W/m2',
+                'volumetric_flux': 'm3/day',
+                'potential': 'm',
+                'theta': 'm3',
+                'volume': 'm3',
+                'wetness': '-'}
+
+time_units = {'y': 365 * 24 * 3600,
+              'd': 24 * 3600,
+              'h': 3600,
+              'm': 60,
+              's': 1}
+
+
+def store_folder(results_path):
+    """Returns the folder of the result store belonging to a results.json file."""
+
+    return os.path.join(os.path.dirname(results_path), store_folder_name)
+
+
+def time_axis(solver_path):
+    """
+    Reads the time axis from the solver settings of a case.
+
+    :param solver_path: Path to solver.json
+    :return: Dict with the start time in ISO format and the time step in seconds or None if there are no settings.
+    :rtype: dict
+    """
+
+    if not os.path.isfile(solver_path):
+        return None
+
+    with open(solver_path, 'r') as solver_file:
+        settings = json.load(solver_file)
+
+    start = settings['start_time']
+    step = settings['time_step']
+
+    return {'start': datetime.datetime(start['year'], start['month'], start['day']).isoformat(),
+            'step': float(step[0]) * time_units.get(step[1], 3600)}
+
+
+def is_up_to_date(results_path, folder=None):
+    """
+    Checks whether the result store of a results.json file exists and is newer than the results.
+
+    :param results_path: Path to results.json
+    :param folder: Folder of the result store. Default is the results folder next to results.json.
+    :return: True if the store is up to date.
+    :rtype: bool
+    """
+
+    if folder is None:
+        folder = store_folder(results_path)
+
+    index_path = os.path.join(folder, index_name)
+    if not os.path.isfile(index_path):
+        return False
+
+    with open(index_path, 'r') as index_file:
+        source = json.load(index_file).get('source', {})
+
+    stat = os.stat(results_path)
+
+    return source.get('size') == stat.st_size and source.get('mtime') == stat.st_mtime
+
+
+def convert_results(results_path, folder=None, chunk_size=2 ** 20):
+    """
+    | Converts a results.json file into a result store.
+    | The results file is streamed and written one cell at a time, so only a single cell is held in memory.
+    | All cells must have the same number of time steps and layers.
+
+    :param results_path: Path to results.json
+    :param folder: Folder of the result store. Default is the results folder next to results.json.
+    :param chunk_size: Number of characters to read from the results file at a time.
+    :return: Path to the index of the store.
+    :rtype: str
+    """
+
+    if folder is None:
+        folder = store_folder(results_path)
+
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+
+    stat = os.stat(results_path)
+    value_files = {}
+    layer_counts = {}
+    timestep_count = None
+    cells = set()
+
+    try:
+        with open(results_path, 'r') as json_file:
+            stream = json_stream.JsonStream(json_file, chunk_size)
+
+            for cell_key in stream.iter_object():
+                cell = result_index(cell_key, 'cell')
+                if cell is None:
+                    stream.skip_value()
+                    continue
+
+                cell_values = read_cell(stream)
+
+                if timestep_count is None:
+                    # The first cell decides the shape of the store
+                    for variable, layers in cell_values.items():
+                        layer_counts[variable] = len(layers)
+                        value_files[variable] = open(os.path.join(folder, variable + value_extension), 'wb')
+                        for series in layers.values():
+                            timestep_count = len(series)
+
+                for variable, layers in cell_values.items():
+                    if variable not in layer_counts or sorted(layers) != list(range(layer_counts[variable])):
+                        raise ValueError('Cell ' + str(cell) + ' does not match the layout of the first cell in: ' +
+                                         str(results_path))
+
+                    for layer, series in layers.items():
+                        if len(series) != timestep_count:
+                            raise ValueError('Cell ' + str(cell) + ' does not have ' + str(timestep_count) +
+                                             ' time steps in: ' + str(results_path))
+
+                        file_obj = value_files[variable]
+                        file_obj.seek((cell * layer_counts[variable] + layer) * timestep_count * value_size)
+                        file_obj.write(mesh_io.array_to_bytes(mesh_io.to_little_endian(series)))
+
+                cells.add(cell)
+
+    finally:
+        for file_obj in value_files.values():
+            file_obj.close()
+
+    if cells and len(cells) != max(cells) + 1:
+        raise ValueError('Cell indices in: ' + str(results_path) + ' are not contiguous')
+
+    index = {'version': store_version,
+             'source': {'size': stat.st_size,
+                        'mtime': stat.st_mtime},
+             'cells': len(cells),
+             'timesteps': timestep_count or 0,
+             'time': time_axis(os.path.join(os.path.dirname(results_path), 'solver.json')),
+             'type_code': 'd',
+             'byte_order': 'little',
+             'variables': {}}
+
+    for variable, layer_count in layer_counts.items():
+        index['variables'][variable] = {'file': variable + value_extension,
+                                        'level': 'layer' if variable in layer_variables else 'cell',
+                                        'layers': layer_count,
+                                        'unit': result_units.get(variable)}
+
+    index_path = os.path.join(folder, index_name)
+    with open(index_path + '_tmp', 'w') as index_file:
+        json.dump(index, index_file, indent=2, sort_keys=True)
+    mesh_io.replace_file(index_path + '_tmp', index_path)
+
+    return index_path
+
+
+def read_cell(stream):
+    """
+    Reads all variables of a cell from a JSON stream.
+
+    :param stream: JSON stream positioned at the cell object.
+    :return: Dict with variable name as key and a dict of layer index and series as value. Cell variables are stored
+             as layer 0.
+    :rtype: dict
+    """
+
+    cell_values = {}
+
+    for key in stream.iter_object():
+        layer = result_index(key, 'layer')
+
+        if layer is None:
+            cell_values.setdefault(key, {})[0] = stream.read_number_array()
+
+        else:
+            for variable in stream.iter_object():
+                cell_values.setdefault(variable, {})[layer] = stream.read_number_array()
+
+    return cell_values
+
+
+def result_index(key, prefix):
+    """
+    Returns the index of a results key like cell_12 or layer_3.
+
+    :param key: Key in the results file.
+    :param prefix: Expected prefix: 'cell' or 'layer'.
+    :return: Index or None if the key does not have the prefix.
+    :rtype: int
+    """
+
+    name, _, index = key.rpartition('_')
+
+    if name == prefix and index.isdigit():
+        return int(index)
+    else:
+        return None
+
+
+class ResultStore:
+    """
+    | Reader for a result store.
+    | The value files are opened and memory mapped the first time a variable is read. Call close() to release them.
+    """
+
+    def __init__(self, folder):
+        """
+        :param folder: Folder of the result store.
+        """
+
+        self.folder = folder
+
+        with open(os.path.join(folder, index_name), 'r') as index_file:
+            self.index = json.load(index_file)
+
+        if self.index.get('version') != store_version:
+            raise ValueError('Unsupported result store version in: ' + str(folder))
+
+        self.variables = self.index['variables']
+        self.cell_count = self.index['cells']
+        self.timestep_count = self.index['timesteps']
+        self.time = self.index['time']
+        self.buffers = {}
+        self.files = {}
+
+    def layer_count(self, variable):
+        """Returns the number of layers of a variable. Cell variables have one layer."""
+
+        return self.variable_info(variable)['layers']
+
+    def variable_info(self, variable):
+        """Returns the index entry of a variable."""
+
+        if variable not in self.variables:
+            raise KeyError('Result: ' + str(variable) + ' is not in the result store: ' + str(self.folder))
+
+        return self.variables[variable]
+
+    def buffer(self, variable):
+        """Returns the memory map, or open file if mmap is not available, of a variable."""
+
+        if variable not in self.buffers:
+            file_obj = open(os.path.join(self.folder, self.variable_info(variable)['file']), 'rb')
+            self.files[variable] = file_obj
+
+            if mmap and os.path.getsize(file_obj.name):
+                self.buffers[variable] = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.buffers[variable] = file_obj
+
+        return self.buffers[variable]
+
+    def time_index(self, time, round_up=True):
+        """
+        Converts a time to a time step index.
+
+        :param time: Time step index, datetime, .NET DateTime or ISO formatted string.
+        :param round_up: Whether a time between two time steps goes to the later (True) or earlier (False) step.
+        :return: Time step index.
+        :rtype: int
+        """
+
+        if isinstance(time, int):
+            return time
+
+        if not self.time:
+            raise ValueError('The result store: ' + str(self.folder) + ' does not have a time axis')
+
+        seconds = total_seconds(to_datetime(time) - to_datetime(self.time['start']))
+        steps = seconds / self.time['step']
+
+        if round_up:
+            return int(math.ceil(steps - 1e-9))
+        else:
+            return int(math.floor(steps + 1e-9))
+
+    def time_slice(self, start=None, end=None, stride=None):
+        """
+        Converts a time window into a time step slice.
+
+        :param start: First time or time step index. Default is the first time step.
+        :param end: Last time or time step index, which is included. Default is the last time step.
+        :param stride: Read every stride'th time step. Default is 1.
+        :return: Slice of time step indices.
+        :rtype: slice
+        """
+
+        start = 0 if start is None else max(0, self.time_index(start, True))
+        stop = self.timestep_count if end is None else min(self.timestep_count, self.time_index(end, False) + 1)
+
+        return slice(start, max(start, stop), max(1, int(stride or 1)))
+
+    def select_cells(self, cells=None):
+        """
+        Converts a cell selection into cell indices.
+
+        :param cells: Cell indices or a mask with a boolean for each cell. Default is all cells.
+        :return: Cell indices.
+        :rtype: list
+        """
+
+        if cells is None:
+            return range(self.cell_count)
+
+        cells = list(cells)
+        if len(cells) == self.cell_count and all(isinstance(cell, bool) for cell in cells):
+            return [index
+                    for index, selected in enumerate(cells)
+                    if selected]
+
+        return [int(cell) for cell in cells]
+
+    def read_series(self, variable, cell, layer=0, steps=None):
+        """
+        Reads the time series of a cell and layer.
+        Only the bytes between the first and last time step of the slice are read.
+
+        :param variable: Name of the variable.
+        :param cell: Cell index.
+        :param layer: Layer index. Cell variables only have layer 0.
+        :param steps: Slice of time steps to read. Default is all time steps.
+        :return: Float array with one value per time step.
+        :rtype: array
+        """
+
+        layer_count = self.layer_count(variable)
+
+        if not 0 <= cell < self.cell_count or not 0 <= layer < layer_count:
+            raise IndexError('Cell ' + str(cell) + ', layer ' + str(layer) + ' is outside of the result store')
+
+        if steps is None:
+            steps = slice(None)
+
+        first, stop, stride = steps.indices(self.timestep_count)
+        if stop <= first:
+            return array('d')
+
+        # End just after the last time step in the slice
+        last = first + (stop - first - 1) // stride * stride + 1
+
+        start = ((cell * layer_count + layer) * self.timestep_count + first) * value_size
+        length = (last - first) * value_size
+        buffer_ = self.buffer(variable)
+
+        if buffer_ is self.files[variable]:
+            buffer_.seek(start)
+            bytes_ = buffer_.read(length)
+        else:
+            bytes_ = buffer_[start:start + length]
+
+        series = mesh_io.from_little_endian(mesh_io.array_from_bytes('d', bytes_))
+
+        if stride != 1:
+            series = series[::stride]
+
+        return series
+
+    def read(self, variable, cells=None, start=None, end=None, stride=None):
+        """
+        Reads a variable for a set of cells and a time window.
+
+        :param variable: Name of the variable.
+        :param cells: Cell indices or cell mask, see select_cells(). Default is all cells.
+        :param start: First time or time step index. Default is the first time step.
+        :param end: Last time or time step index, which is included. Default is the last time step.
+        :param stride: Read every stride'th time step. Default is 1.
+        :return: List with an entry for each cell. Cell variables have a float array per cell and layer variables have
+                 a list of float arrays, one per layer.
+        :rtype: list
+        """
+
+        cells = self.select_cells(cells)
+        steps = self.time_slice(start, end, stride)
+
+        if self.variable_info(variable)['level'] == 'cell':
+            return [self.read_series(variable, cell, 0, steps)
+                    for cell in cells]
+
+        else:
+            layers = range(self.layer_count(variable))
+            return [[self.read_series(variable, cell, layer, steps)
+                     for layer in layers]
+                    for cell in cells]
+
+    def close(self):
+        """Releases the memory maps and files."""
+
+        for variable, buffer_ in self.buffers.items():
+            if buffer_ is not self.files[variable]:
+                buffer_.close()
+            self.files[variable].close()
+
+        self.buffers = {}
+        self.files = {}
+
+
+def to_datetime(time):
+    """
+    Converts a time to a datetime.
+
+    :param time: datetime, .NET DateTime or ISO formatted string.
+    :return: Datetime
+    :rtype: datetime.datetime
+    """
+
+    if isinstance(time, datetime.datetime):
+        return time
+
+    elif hasattr(time, 'Year'):
+        return datetime.datetime(time.Year, time.Month, time.Day, time.Hour, time.Minute, time.Second)
+
+    else:
+        text = str(time).strip().replace(' ', 'T')
+        for format_ in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+            try:
+                return datetime.datetime.strptime(text, format_)
+            except ValueError:
+                continue
+
+        raise ValueError('Could not convert: ' + str(time) + ' to a time')
+
+
+def total_seconds(delta):
+    """Returns the length of a timedelta in seconds."""
+
+    return delta.days * 24 * 3600 + delta.seconds + delta.microseconds / 1e6
@@ -0,0 +1,227 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import heapq
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Spatial Index
+
+
+class PointIndex:
+    """
+    | A k-d tree over a set of 3D points, e.g. the face centroids of a mesh.
+    | The tree is stored implicitly: The points are ordered so that the node of the range [lo, hi) is the median
+    | point at (lo + hi) // 2, which splits the range along the axis stored for that node.
+    | Nearest point and radius queries visit a logarithmic number of nodes on average.
+    """
+
+    def __init__(self, points):
+        """
+        Builds the index.
+
+        :param points: Flat list of point coordinates: x, y, z, x, y, z, ...
+        """
+
+        self.points = array('d', points)
+        self.count = len(self.points) // 3
+        self.order = array('i', range(self.count))
+        self.axes = array('b', [0]) * self.count
+
+        self.build()
+
+    def build(self):
+        """Orders the points into the implicit k-d tree."""
+
+        points = self.points
+        order = self.order
+        stack = [(0, self.count), ]
+
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo < 2:
+                continue
+
+            # Split along the axis with the largest extent
+            extents = []
+            for axis in range(3):
+                values = [points[3 * i + axis] for i in order[lo:hi]]
+                extents.append(max(values) - min(values))
+            axis = extents.index(max(extents))
+
+            order[lo:hi] = array('i', sorted(order[lo:hi], key=lambda i: points[3 * i + axis]))
+
+            mid = (lo + hi) // 2
+            self.axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def nearest(self, x, y, z):
+        """
+        Finds the point closest to a location.
+
+        :param x: X coordinate.
+        :param y: Y coordinate.
+        :param z: Z coordinate.
+        :return: Index of the closest point and the squared distance to it. Index is -1 if the index is empty.
+        :rtype: tuple
+        """
+
+        points = self.points
+        order = self.order
+        axes = self.axes
+        location = (x, y, z)
+
+        best_index = -1
+        best_distance = float('inf')
+        stack = [(0, self.count, 0.0), ]
+
+        while stack:
+            lo, hi, bound = stack.pop()
+            if lo >= hi or bound >= best_distance:
+                continue
+
+            mid = (lo + hi) // 2
+            i = order[mid]
+            dx = points[3 * i] - x
+            dy = points[3 * i + 1] - y
+            dz = points[3 * i + 2] - z
+            distance = dx * dx + dy * dy + dz * dz
+
+            if distance < best_distance:
+                best_index = i
+                best_distance = distance
+
+            axis = axes[mid]
+            difference = location[axis] - points[3 * i + axis]
+
+            if difference < 0:
+                stack.append((mid + 1, hi, difference * difference))
+                stack.append((lo, mid, 0.0))
+            else:
+                stack.append((lo, mid, difference * difference))
+                stack.append((mid + 1, hi, 0.0))
+
+        return best_index, best_distance
+
+    def nearest_k(self, x, y, z, k):
+        """
+        Finds the k points closest to a location.
+
+        :param x: X coordinate.
+        :param y: Y coordinate.
+        :param z: Z coordinate.
+        :param k: Number of points to find.
+        :return: Indices of the closest points and their squared distances, ordered by distance.
+        :rtype: tuple
+        """
+
+        points = self.points
+        order = self.order
+        axes = self.axes
+        location = (x, y, z)
+
+        # Max heap of the k best points so far, stored with negated distances
+        best = []
+        worst_distance = float('inf')
+        stack = [(0, self.count, 0.0), ]
+
+        while stack:
+            lo, hi, bound = stack.pop()
+            if lo >= hi or bound >= worst_distance:
+                continue
+
+            mid = (lo + hi) // 2
+            i = order[mid]
+            dx = points[3 * i] - x
+            dy = points[3 * i + 1] - y
+            dz = points[3 * i + 2] - z
+            distance = dx * dx + dy * dy + dz * dz
+
+            if len(best) < k:
+                heapq.heappush(best, (-distance, i))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, i))
+            if len(best) == k:
+                worst_distance = -best[0][0]
+
+            axis = axes[mid]
+            difference = location[axis] - points[3 * i + axis]
+
+            if difference < 0:
+                stack.append((mid + 1, hi, difference * difference))
+                stack.append((lo, mid, 0.0))
+            else:
+                stack.append((lo, mid, difference * difference))
+                stack.append((mid + 1, hi, 0.0))
+
+        best.sort(reverse=True)
+
+        return array('i', [i for _, i in best]), array('d', [-distance for distance, _ in best])
+
+    def nearest_many(self, locations):
+        """
+        Finds the closest point for many locations.
+
+        :param locations: Flat list of location coordinates: x, y, z, x, y, z, ...
+        :return: Index of the closest point for each location.
+        :rtype: array
+        """
+
+        nearest = self.nearest
+
+        return array('i', [nearest(locations[j], locations[j + 1], locations[j + 2])[0]
+                           for j in range(0, len(locations), 3)])
+
+    def within_radius(self, x, y, z, radius):
+        """
+        Finds all points within a radius of a location.
+
+        :param x: X coordinate.
+        :param y: Y coordinate.
+        :param z: Z coordinate.
+        :param radius: Search radius.
+        :return: Indices of the points within the radius.
+        :rtype: list
+        """
+
+        points = self.points
+        order = self.order
+        axes = self.axes
+        location = (x, y, z)
+        radius_squared = radius * radius
+
+        found = []
+        stack = [(0, self.count), ]
+
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+
+            mid = (lo + hi) // 2
+            i = order[mid]
+            dx = points[3 * i] - x
+            dy = points[3 * i + 1] - y
+            dz = points[3 * i + 2] - z
+
+            if dx * dx + dy * dy + dz * dz <= radius_squared:
+                found.append(i)
+
+            axis = axes[mid]
+            difference = location[axis] - points[3 * i + axis]
+
+            if difference <= radius:
+                stack.append((lo, mid))
+            if difference >= -radius:
+                stack.append((mid + 1, hi))
+
+        return found
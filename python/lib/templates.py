@@ -121,24 +121,42 @@ def cmf_template(path):
 
     file_name = r'/cmf_template.py'
     file_ = open(path + file_name, 'w')
+    file_.write(cmf_template_text(path))
+    file_.close()
 
-    file_.write("# Imports\n")
-    #file.write("from pathlib import Path\n")
-    #file.write("home_user = str(Path.home())\n")
-    #file.write("import sys\n")
-    #file.write("sys.path.insert(0, r'C:\Users\Christian\Dropbox\Arbejde\DTU BYG\Livestock\livestock')\n")
-    file_.write("from livestock.hydrology import run_model\n")
+    return True
 
-    file_.write("# Run CMF Model\n")
-    file_.write("run_model(r'" + path + "')\n")
 
-    file_.write("# Announce that template finished and create out file\n")
-    file_.write("print('Finished with template')\n")
-    file_.write("file_obj = open('out.txt', 'w')\n")
-    file_.write("file_obj.close()")
-    file_.close()
+def cmf_template_text(path):
+    """
+    Returns the content of the CMF template, so it can be written with a CaseWriter.
 
-    return True
+    :param path: Path of the case folder.
+    :return: Template content.
+    :rtype: str
+    """
+
+    lines = ["# Imports\n",
+             "import os\n",
+             "import sys\n",
+             "from livestock.hydrology import run_model\n",
+
+             "# Write weather.json from the weather store\n",
+             "if os.path.isfile(os.path.join(r'" + path + "', 'weather_index.json')):\n",
+             "    sys.path.insert(0, r'" + path + "')\n",
+             "    sys.dont_write_bytecode = True\n",
+             "    from weather_reader import expand_weather\n",
+             "    expand_weather(r'" + path + "')\n",
+
+             "# Run CMF Model\n",
+             "run_model(r'" + path + "')\n",
+
+             "# Announce that template finished and create out file\n",
+             "print('Finished with template')\n",
+             "file_obj = open('out.txt', 'w')\n",
+             "file_obj.close()"]
+
+    return ''.join(lines)
 
 
 def process_cmf_results(path):
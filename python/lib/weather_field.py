@@ -0,0 +1,145 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+
+# Livestock imports
+from livestock.lib.spatial_index import PointIndex
+from livestock.lib.weather_reader import weighted_series
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Weather Field
+#
+# Spatially varying weather from a few weather stations. The series of each cell is a weighted sum of the station
+# series. The weights are computed once from the cell centroids by inverse distance weighting, optionally limited to
+# the nearest stations, and stored as a sparse matrix in CSR form: the weights of cell i are weights[offsets[i]:
+# offsets[i + 1]] for the stations indices[offsets[i]:offsets[i + 1]].
+# The weights of each cell sum to 1, so a unit conversion (value * scale + offset) can be applied to the station series
+# instead of the cell series.
+# On the solver side, livestock.lib.weather_reader expands the fields of the weather store to a series per cell.
+
+
+def station_weights(centroids, stations, neighbours=None, power=2.0):
+    """
+    Computes the inverse distance weights of the stations for each cell.
+    A cell at the same location as a station gets the series of that station.
+
+    :param centroids: Flat list of cell centroid coordinates: x, y, z, x, y, z, ...
+    :param stations: Flat list of station coordinates: x, y, z, x, y, z, ...
+    :param neighbours: Number of nearest stations to use for each cell. Default is all stations.
+    :param power: Power of the inverse distance. 0 gives the mean of the stations.
+    :return: Offset array, station index array and weight array in CSR form.
+    :rtype: tuple
+    """
+
+    index = PointIndex(stations)
+    if not index.count:
+        raise ValueError('A weather field needs at least one station')
+
+    if not neighbours or neighbours > index.count:
+        neighbours = index.count
+
+    half_power = power / 2.0
+    offsets = array('i', [0])
+    indices = array('i')
+    weights = array('d')
+
+    for j in range(0, len(centroids), 3):
+        nearest, distances = index.nearest_k(centroids[j], centroids[j + 1], centroids[j + 2], neighbours)
+
+        if distances[0] == 0.0:
+            indices.append(nearest[0])
+            weights.append(1.0)
+
+        else:
+            # Distances are squared, so the power is halved
+            inverse = [distance ** -half_power for distance in distances]
+            total = sum(inverse)
+            indices.extend(nearest)
+            weights.extend([value / total for value in inverse])
+
+        offsets.append(len(indices))
+
+    return offsets, indices, weights
+
+
+class WeatherField:
+    """
+    | Weather parameter given by station series and station weights.
+    | Behaves as the dict with 'cell_N' keys used for weather given per cell, but the series of a cell is only computed
+    | when it is looked up.
+    """
+
+    def __init__(self, weights, station_series):
+        """
+        :param weights: Offset array, station index array and weight array. See station_weights().
+        :param station_series: List with a float array per station.
+        """
+
+        self.offsets, self.indices, self.weights = weights
+        self.station_series = list(station_series)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        return self.cell_index(key) is not None
+
+    def __getitem__(self, key):
+        cell = self.cell_index(key)
+
+        if cell is None:
+            raise KeyError(key)
+
+        return self.series(cell)
+
+    def cell_index(self, key):
+        """Returns the cell index of a 'cell_N' key or None, if the key does not belong to a cell of the field."""
+
+        try:
+            cell = int(str(key).split('cell_')[1])
+        except (IndexError, ValueError):
+            return None
+
+        if 0 <= cell < len(self):
+            return cell
+        else:
+            return None
+
+    def series(self, cell):
+        """
+        Computes the weather series of a cell.
+
+        :param cell: Cell index.
+        :return: Series of the cell.
+        :rtype: array
+        """
+
+        start = self.offsets[cell]
+        end = self.offsets[cell + 1]
+
+        return weighted_series(self.station_series, self.indices[start:end], self.weights[start:end])
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        else:
+            return default
+
+    def keys(self):
+        return ['cell_' + str(cell) for cell in range(len(self))]
+
+    def values(self):
+        return [self.series(cell) for cell in range(len(self))]
+
+    def items(self):
+        return [('cell_' + str(cell), self.series(cell)) for cell in range(len(self))]
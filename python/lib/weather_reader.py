@@ -0,0 +1,217 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import json
+import os
+import sys
+
+# Livestock imports
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Weather Reader
+#
+# Solver side reader of the weather store written by livestock.lib.weather_store.
+# The module only uses the standard library, so CMFSolve copies it into the case folder, where the CMF template imports
+# it with the CPython interpreter that runs the solver. Before the model is run, expand_weather() writes weather.json in
+# the layout the solver reads: a dict with 'all' or 'cell_N' keys and a list of values for each weather parameter.
+
+index_name = 'weather_index.json'
+series_name = 'weather.lsweather'
+weather_name = 'weather.json'
+weather_format = 'livestock_weather'
+weather_version = 1
+
+
+def read_index(folder):
+    """
+    Reads the index of the weather store of a case folder.
+
+    :param folder: Case folder.
+    :return: Weather store index.
+    :rtype: dict
+    """
+
+    with open(os.path.join(folder, index_name), 'r') as file_obj:
+        index = json.load(file_obj)
+
+    if index.get('format') != weather_format or index.get('version', 0) > weather_version:
+        raise ValueError('Unsupported weather store in: ' + str(folder))
+
+    return index
+
+
+def read_series(folder, index):
+    """
+    Reads the packed series of a weather store.
+
+    :param folder: Case folder.
+    :param index: Weather store index.
+    :return: List with a float array per series.
+    :rtype: list
+    """
+
+    values = array('d')
+    with open(os.path.join(folder, index['file']), 'rb') as file_obj:
+        content = file_obj.read()
+
+    if hasattr(values, 'frombytes'):
+        values.frombytes(content)
+    else:
+        values.fromstring(content)
+
+    # The series are stored as little-endian
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return [values[offset:offset + length]
+            for offset, length in index['series']]
+
+
+def transform(values, scale=1.0, offset=0.0):
+    """
+    Applies a unit conversion to a series: value * scale + offset.
+
+    :param values: Float array.
+    :param scale: Scale of the conversion.
+    :param offset: Offset of the conversion.
+    :return: Converted values. The values themselves, if the conversion does not change them.
+    :rtype: array
+    """
+
+    if scale == 1.0 and offset == 0.0:
+        return values
+
+    return array('d', [value * scale + offset for value in values])
+
+
+def weighted_series(station_series, stations, weights):
+    """
+    Computes the weighted sum of station series.
+
+    :param station_series: List with a float array per station.
+    :param stations: Station indices.
+    :param weights: Weight of each station.
+    :return: Weighted series.
+    :rtype: array
+    """
+
+    if len(stations) == 1 and weights[0] == 1.0:
+        return station_series[stations[0]]
+
+    series = [station_series[station] for station in stations]
+
+    return array('d', [sum([weight * values[step] for weight, values in zip(weights, series)])
+                       for step in range(len(series[0]))])
+
+
+def parameter_series(parameter, series):
+    """
+    Generates the series of a weather parameter with the unit conversion applied.
+
+    :param parameter: Parameter entry of the weather store index.
+    :param series: List of series. See read_series().
+    :return: Generator of key and series pairs. The key is 'all' or 'cell_N'. Weather fields are expanded to a series
+             per cell.
+    :rtype: generator
+    """
+
+    scale = parameter.get('scale', 1.0)
+    offset = parameter.get('offset', 0.0)
+
+    if 'stations' in parameter:
+        # Weather field. The weights of a cell sum to 1, so the unit conversion is applied to the station series.
+        station_series = [transform(series[station], scale, offset)
+                          for station in parameter['stations']]
+        offsets = [int(number) for number in series[parameter['offsets']]]
+        indices = [int(number) for number in series[parameter['indices']]]
+        weights = series[parameter['weights']]
+
+        for cell in range(len(offsets) - 1):
+            start = offsets[cell]
+            end = offsets[cell + 1]
+            yield 'cell_' + str(cell), weighted_series(station_series, indices[start:end], weights[start:end])
+
+    elif 'all' in parameter:
+        yield 'all', transform(series[parameter['all']], scale, offset)
+
+    else:
+        converted = {}
+        for cell, series_index in enumerate(parameter['cells']):
+            if series_index not in converted:
+                converted[series_index] = transform(series[series_index], scale, offset)
+            yield 'cell_' + str(cell), converted[series_index]
+
+
+def is_up_to_date(folder):
+    """Returns True if weather.json has been written after the weather store of a case folder."""
+
+    weather_path = os.path.join(folder, weather_name)
+    if not os.path.isfile(weather_path):
+        return False
+
+    store_time = max(os.path.getmtime(os.path.join(folder, index_name)),
+                     os.path.getmtime(os.path.join(folder, series_name)))
+
+    return os.path.getmtime(weather_path) > store_time
+
+
+def expand_weather(folder, force=False):
+    """
+    Writes the weather store of a case folder as weather.json, in the layout the solver reads.
+    The file is written one series at a time, so the expanded weather is never held in memory.
+
+    :param folder: Case folder.
+    :param force: Write weather.json, even if it is newer than the weather store.
+    :return: Path of weather.json.
+    :rtype: str
+    """
+
+    weather_path = os.path.join(folder, weather_name)
+
+    if not force and is_up_to_date(folder):
+        return weather_path
+
+    index = read_index(folder)
+    series = read_series(folder, index)
+    values = dict((key, value)
+                  for key, value in index.items()
+                  if key not in ('format', 'version', 'file', 'series', 'parameters'))
+
+    with open(weather_path + '.tmp', 'w') as file_obj:
+        file_obj.write('{')
+        separator = ''
+
+        for key in sorted(values):
+            file_obj.write(separator + json.dumps(key) + ': ' + json.dumps(values[key]))
+            separator = ', '
+
+        for key in sorted(index['parameters']):
+            parameter = index['parameters'][key]
+            file_obj.write(separator + json.dumps(key) + ': ')
+            separator = ', '
+
+            if not parameter:
+                file_obj.write(json.dumps(parameter))
+                continue
+
+            file_obj.write('{')
+            series_separator = ''
+            for series_key, values_ in parameter_series(parameter, series):
+                file_obj.write(series_separator + json.dumps(series_key) + ': ' + json.dumps(values_.tolist()))
+                series_separator = ', '
+            file_obj.write('}')
+
+        file_obj.write('}')
+
+    if os.path.exists(weather_path):
+        os.remove(weather_path)
+    os.rename(weather_path + '.tmp', weather_path)
+
+    return weather_path
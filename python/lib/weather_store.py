@@ -0,0 +1,225 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import hashlib
+import json
+import os
+import sys
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+import livestock.lib.weather_reader as weather_reader
+from livestock.lib.weather_field import WeatherField
+from livestock.lib.weather_reader import index_name, series_name, weather_name, weather_format, weather_version
+from livestock.lib.weather_reader import read_series, transform
+
+# Grasshopper imports
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Weather Store
+#
+# Compact storage of the CMF weather. Every distinct series is stored once in a binary file of little-endian float64
+# values (weather.lsweather). The series are deduplicated by the sha1 hash of their packed values, so a series shared
+# by all cells only takes up space once.
+# weather_index.json holds the index: the offset and length of each series and, for each weather parameter, either the
+# series used by all cells ({'all': series}), one series per cell ({'cells': [series, ...]}) or a weather field with a
+# series per station and the station weights of the cells ({'stations': [series, ...], 'offsets': series,
+# 'indices': series, 'weights': series}). See livestock.lib.weather_field. The offsets and station indices of a field
+# are packed as float64 too, which holds them exactly.
+# Unit conversions are not applied to the series. They are stored as a scale and offset for each parameter and applied
+# when the weather is read, so the series are only copied once.
+# read_weather() maps the index back to the original layout, with 'all' or 'cell_N' keys for each parameter.
+# The solver reads weather.json in the original layout. It is written from the store on the solver side, by
+# livestock.lib.weather_reader, which is copied into the case folder and called by the CMF template.
+
+value_size = 8
+reader_name = 'weather_reader.py'
+
+weather_parameters = ('temp', 'wind', 'rel_hum', 'sun', 'rad', 'rain', 'ground_temp')
+
+
+class SeriesPacker:
+    """Collects series and packs each distinct series once."""
+
+    def __init__(self):
+        self.series = []
+        self.chunks = []
+        self.hashes = {}
+        self.length = 0
+
+    def add(self, values):
+        """
+        Adds a series, unless an identical series has already been added.
+
+        :param values: Float array or sequence of numbers.
+        :return: Index of the series.
+        :rtype: int
+        """
+
+        # Byte swapping on big-endian machines is done in place, so the series of the caller is copied first
+        if not isinstance(values, array) or values.typecode != 'd' or sys.byteorder == 'big':
+            values = array('d', [float(value) for value in values])
+
+        content = mesh_io.array_to_bytes(mesh_io.to_little_endian(values))
+        digest = hashlib.sha1(content).hexdigest()
+
+        if digest not in self.hashes:
+            self.hashes[digest] = len(self.series)
+            self.series.append([self.length, len(values)])
+            self.chunks.append(content)
+            self.length += len(values)
+
+        return self.hashes[digest]
+
+    def content(self):
+        """Returns the packed series as bytes."""
+
+        return b''.join(self.chunks)
+
+
+def encode_weather(weather_dict):
+    """
+    Encodes a weather dict, as made by the CMF Weather component, into an index and packed series.
+
+    :param weather_dict: Dict with a dict of series per weather parameter, keyed with 'all' or 'cell_N'. The optional
+                         key 'transforms' holds the unit conversion of a parameter as a (scale, offset) pair.
+    :return: Index as dict and the packed series as bytes.
+    :rtype: tuple
+    """
+
+    packer = SeriesPacker()
+    parameters = {}
+    index = {'format': weather_format,
+             'version': weather_version,
+             'file': series_name,
+             'parameters': parameters}
+
+    transforms = weather_dict.get('transforms') or {}
+
+    for key, value in weather_dict.items():
+        if key == 'transforms':
+            continue
+
+        elif key not in weather_parameters:
+            index[key] = value
+
+        elif not value:
+            parameters[key] = None
+
+        elif isinstance(value, WeatherField):
+            parameters[key] = {'stations': [packer.add(series)
+                                            for series in value.station_series],
+                               'offsets': packer.add(value.offsets),
+                               'indices': packer.add(value.indices),
+                               'weights': packer.add(value.weights)}
+
+        elif 'all' in value:
+            parameters[key] = {'all': packer.add(value['all'])}
+
+        else:
+            cells = [packer.add(value['cell_' + str(cell)])
+                     for cell in range(len(value))]
+            parameters[key] = {'cells': cells}
+
+        if value and key in transforms:
+            parameters[key]['scale'], parameters[key]['offset'] = transforms[key]
+
+    index['series'] = packer.series
+
+    return index, packer.content()
+
+
+def write_weather(weather_dict, writer):
+    """
+    Writes a weather dict into a case folder together with the solver side reader.
+
+    :param weather_dict: Weather dict. See encode_weather().
+    :param writer: CaseWriter of the case folder.
+    :return: Names of the written files.
+    :rtype: list
+    """
+
+    index, content = encode_weather(weather_dict)
+
+    return [writer.write_bytes(series_name, content),
+            writer.write_json(index_name, index),
+            writer.write_text(reader_name, reader_source())]
+
+
+def reader_source():
+    """Returns the source code of livestock.lib.weather_reader, which is copied into the case folder."""
+
+    source_path = os.path.splitext(weather_reader.__file__)[0] + '.py'
+
+    with open(source_path, 'r') as file_obj:
+        return file_obj.read()
+
+
+def decode_weather(index, series):
+    """
+    Maps a weather store index back to a weather dict and applies the unit conversions.
+    Cells using the same series share the same array.
+
+    :param index: Weather store index.
+    :param series: List of series. See read_series().
+    :return: Weather dict with 'all' or 'cell_N' keys for each weather parameter. Weather fields are returned as
+             WeatherField, which computes the series of a cell when it is looked up.
+    :rtype: dict
+    """
+
+    weather_dict = {}
+
+    for key, value in index.items():
+        if key not in ('format', 'version', 'file', 'series', 'parameters'):
+            weather_dict[key] = value
+
+    for key, value in index['parameters'].items():
+        if not value:
+            weather_dict[key] = value
+            continue
+
+        scale = value.get('scale', 1.0)
+        offset = value.get('offset', 0.0)
+        converted = {}
+
+        def get_series(series_index):
+            if series_index not in converted:
+                converted[series_index] = transform(series[series_index], scale, offset)
+            return converted[series_index]
+
+        if 'stations' in value:
+            weights = (array('i', [int(number) for number in series[value['offsets']]]),
+                       array('i', [int(number) for number in series[value['indices']]]),
+                       series[value['weights']])
+            weather_dict[key] = WeatherField(weights, [get_series(station) for station in value['stations']])
+
+        elif 'all' in value:
+            weather_dict[key] = {'all': get_series(value['all'])}
+
+        else:
+            weather_dict[key] = dict(('cell_' + str(cell), get_series(series_index))
+                                     for cell, series_index in enumerate(value['cells']))
+
+    return weather_dict
+
+
+def read_weather(folder):
+    """
+    Reads the weather of a case folder. Weather written as plain JSON by earlier versions is returned as it is.
+
+    :param folder: Case folder.
+    :return: Weather dict with 'all' or 'cell_N' keys for each weather parameter.
+    :rtype: dict
+    """
+
+    if os.path.isfile(os.path.join(folder, index_name)):
+        index = weather_reader.read_index(folder)
+        return decode_weather(index, read_series(folder, index))
+
+    with open(os.path.join(folder, weather_name), 'r') as file_obj:
+        return json.load(file_obj)
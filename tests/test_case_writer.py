@@ -0,0 +1,64 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+import os
+import shutil
+import tempfile
+import unittest
+
+# Livestock imports
+import livestock.lib.weather_reader as weather_reader
+import livestock.lib.weather_store as weather_store
+from livestock.lib.case_writer import CaseWriter
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Case Writer Tests
+
+
+class TestGeneratedFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write_case(self, weather=None):
+        writer = CaseWriter(self.folder, generated=[weather_store.weather_name])
+        writer.write_text('solver.xml', '<solver/>')
+
+        if weather:
+            weather_store.write_weather(weather, writer)
+
+        writer.finish()
+
+        return writer
+
+    def test_case_without_weather_removes_expanded_weather(self):
+        self.write_case({'temp': {'all': [1.0, 2.0, 3.0]}})
+        weather_reader.expand_weather(self.folder)
+        self.assertTrue(os.path.isfile(os.path.join(self.folder, weather_store.weather_name)))
+
+        writer = self.write_case()
+
+        self.assertIn(weather_store.index_name, writer.removed)
+        self.assertFalse(os.path.isfile(os.path.join(self.folder, weather_store.index_name)))
+        self.assertFalse(os.path.isfile(os.path.join(self.folder, weather_store.weather_name)))
+
+    def test_unchanged_case_keeps_expanded_weather(self):
+        weather = {'temp': {'all': [1.0, 2.0, 3.0]}}
+        self.write_case(weather)
+        weather_reader.expand_weather(self.folder)
+
+        writer = self.write_case(weather)
+
+        self.assertFalse(writer.changed)
+        self.assertTrue(os.path.isfile(os.path.join(self.folder, weather_store.weather_name)))
+
+
+if __name__ == '__main__':
+    unittest.main()
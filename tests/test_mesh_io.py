@@ -0,0 +1,47 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import os
+import shutil
+import tempfile
+import unittest
+
+# Livestock imports
+import livestock.lib.mesh_io as mesh_io
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Mesh IO Tests
+
+
+class TestObjRoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_large_offset_coordinates(self):
+        vertices = array('d', [512345.678, 6123456.789, 12.345,
+                               512346.678, 6123456.789, 12.345,
+                               512346.678, 6123457.789, 13.345,
+                               512345.678, 6123457.789, 13.345])
+        faces = array('i', [0, 1, 2, 3])
+
+        path = mesh_io.write_obj(os.path.join(self.folder, 'mesh'), vertices, faces)
+        read_vertices, read_faces = mesh_io.read_obj(path)
+
+        self.assertEqual(list(read_vertices), list(vertices))
+        self.assertEqual(list(read_faces), list(faces))
+
+        with open(path, 'r') as file_obj:
+            self.assertIn('v 512345.678 6123456.789 12.345', file_obj.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+__author__ = "Christian Kongsgaard"
+__license__ = "GNU GPLv3"
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Imports
+
+# Module imports
+from array import array
+import random
+import unittest
+
+# Livestock imports
+from livestock.lib.raytrace import RayTracer
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Livestock Ray Tracing Tests
+
+
+def unit_box():
+    """Returns the vertices and quad faces of a closed unit box."""
+
+    vertices = array('d', [0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0,
+                           0, 0, 1, 1, 0, 1, 1, 1, 1, 0, 1, 1])
+    faces = array('i', [0, 3, 2, 1,
+                        4, 5, 6, 7,
+                        0, 1, 5, 4,
+                        2, 3, 7, 6,
+                        1, 2, 6, 5,
+                        3, 0, 4, 7])
+
+    return vertices, faces
+
+
+class TestRayTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = RayTracer(*unit_box())
+
+    def test_reflection(self):
+        traced = self.tracer.trace(array('d', [0.5, 0.5, 0.5]), array('d', [0, 0, 1]), 1)
+
+        self.assertEqual(list(traced['faces']), [1, 0])
+        self.assertAlmostEqual(traced['points'][2], 1.0)
+        self.assertAlmostEqual(traced['points'][5], 0.0)
+        self.assertAlmostEqual(traced['distances'][0], 0.5)
+        self.assertAlmostEqual(traced['distances'][1], 1.0)
+
+    def test_edge_hit_stays_inside(self):
+        # The first hit is exactly on the edge between the faces at y = 1 and z = 1
+        traced = self.tracer.trace(array('d', [0.25, 0.5, 0.5]), array('d', [1, 1, 1]), 5)
+
+        self.assertNotIn(-1, list(traced['faces']))
+        self.assertAlmostEqual(traced['points'][0], 0.75)
+        self.assertAlmostEqual(traced['points'][1], 1.0)
+        self.assertAlmostEqual(traced['points'][2], 1.0)
+
+    def test_random_rays_stay_inside(self):
+        generator = random.Random(1)
+        origins = array('d')
+        directions = array('d')
+
+        for ray in range(200):
+            origins.extend([generator.uniform(0.1, 0.9) for k in range(3)])
+            directions.extend([generator.uniform(-1, 1) for k in range(3)])
+
+        traced = self.tracer.trace(origins, directions, 5)
+
+        self.assertNotIn(-1, list(traced['faces']))
+        for value in traced['points']:
+            self.assertTrue(-1e-6 < value < 1 + 1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()